@@ -3,221 +3,643 @@
 import json
 import re
 import time
-import sys
-import os
-from openai import OpenAI
-
-# 从config.json读取debug配置
-def load_debug_config():
-    """从config.json加载debug配置"""
-    try:
-        with open('config.json', 'r', encoding='utf-8') as f:
-            config = json.load(f)
-            return config.get('debug', False)
-    except Exception:
-        return False
-
-DEBUG = load_debug_config()
+import uuid
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from cache import ResponseCache, ToolCache, make_cache_key
+from config import get_config
+from connection import ConnectionManager
+from context import ContextWindow, count_tokens, count_message_tokens
+from metrics import Turn, get_metrics
+from recording import Recorder
+from resilience import (CircuitBreaker, CircuitOpenError, RateLimitExceeded, RetryPolicy,
+                        TokenBucket, is_transient)
+from router import Backend, HedgeLost, Router
+from tool_pool import ToolProcessPool
+from tool_registry import ToolRegistry
 
 def print_debug(message):
     """打印调试信息"""
-    if DEBUG:
+    if get_config().debug:
         print(f"[AI DEBUG] {message}")
 
 class AI:
     """AI管理类"""
 
     def __init__(self, config):
-        """初始化AI管理器"""
+        """初始化AI管理器
+
+        openai客户端在首次使用（或后台preload）时才加载，工具模块在首次调用时才导入，不拖慢启动
+        """
+        self.router = None
+        self.on_status = None
+        self.context = ContextWindow()
+        self.recorder = None
+        self.connection = None
+        self.tool_cache = ToolCache()
+        get_metrics().add_source("tool_cache", self.get_tool_cache_stats)
+        self.tool_pool = None
+        self.tool_pool_config = None
+        # 当前轮次的计时记录，send_message期间指向正在进行的轮次
+        self.turn = Turn()
+
+        # 读取可热重载的配置（模型、提示词、工具等）
+        self.apply_config(config)
+
+        self.tool_executor = ThreadPoolExecutor(
+            max_workers=config.get('max_tool_workers', 4),
+            thread_name_prefix="tool"
+        )
+
+        # 回复缓存：键由模型、实际发送的完整消息窗口和工具描述决定；
+        # 设置context_turns时改为只用当前轮次（及之前context_turns轮）的消息，命中更多但可能答非所问
+        cache_config = config.get('response_cache', {})
+        self.response_cache = None
+        self.cache_context_turns = cache_config.get('context_turns')
+        if cache_config.get('enabled', False):
+            try:
+                self.response_cache = ResponseCache(
+                    max_entries=cache_config.get('max_entries', 256),
+                    ttl_seconds=cache_config.get('ttl_seconds', 3600),
+                    db_path=cache_config.get('db_path') or None
+                )
+            except Exception as e:
+                print_debug(f"回复缓存初始化失败: {str(e)}")
+
+        print_debug(f"AI初始化完成，支持{len(self.tools)}个工具")
+
+    def apply_config(self, config):
+        """应用配置，启动时和config.json热重载后调用"""
         # 保存配置
         self.api_key = config.get('api_key', '')
         self.api_base = config.get('api_base', 'https://api.openai.com/v1')
         self.model = config.get('model', 'gpt-3.5-turbo')
         self.system_prompt = config.get('system_prompt', '')
+        self.stream = config.get('stream', True)
+        # 原生工具调用（tools/tool_calls）；后端不支持时设为false，回退到```json代码块
+        self.native_tools = config.get('native_tools', True)
+        self.json_tool_prompt = config.get('json_tool_prompt', '')
         self.functions_config = config.get('functions', [])
 
-        # 动态导入functions模块
-        self.functions_module = self.load_functions_module()
+        # 工具插件：扫描plugins目录生成工具描述，functions中的同名条目可以覆盖描述、参数等
+        self.tool_registry = ToolRegistry(config.get('plugin_dirs', ['plugins']), self.functions_config)
 
-        # 初始化OpenAI客户端
-        try:
-            self.client = OpenAI(api_key=self.api_key, base_url=self.api_base)
-            print_debug("OpenAI客户端初始化成功")
-        except Exception as e:
-            print_debug(f"OpenAI客户端初始化失败: {str(e)}")
-            self.client = None
+        # 有副作用的工具（打开程序、调音量等）的结果不参与回复缓存
+        self.side_effect_tools = self.tool_registry.side_effect_tools()
 
-        # 消息历史记录
-        self.messages = []
+        # 同一轮的多个工具调用并行执行，每个工具可以单独声明超时（秒）
+        self.tool_timeout = config.get('tool_timeout_seconds', 30)
+        self.tool_timeouts = self.tool_registry.timeouts()
 
-        # 添加系统提示词
-        if self.system_prompt:
-            self.messages.append({
-                "role": "system",
-                "content": self.system_prompt
-            })
+        # 工具结果缓存：functions中按工具声明cache策略，有副作用的工具始终不缓存
+        tool_cache_policies = {}
+        for func in self.functions_config:
+            policy = func.get('cache', 'none')
+            if policy == 'none':
+                continue
+            if func['name'] in self.side_effect_tools:
+                print(f"警告：工具 {func['name']} 有副作用，忽略其缓存策略")
+                continue
+            tool_cache_policies[func['name']] = policy
+        self.tool_cache.configure(tool_cache_policies)
 
-        # 准备工具描述
-        self.tools = self.prepare_tools()
+        # 工具进程池：tool_pool.tools中的工具在独立的工作进程中执行，超时后强制结束进程；
+        # 工作进程使用与这里相同的插件目录和functions覆盖，任何一项变化都重建进程池
+        pool_config = (config.get('tool_pool', {}), config.get('plugin_dirs', ['plugins']), self.functions_config)
+        if pool_config != self.tool_pool_config:
+            reloading = self.tool_pool_config is not None
+            self.close_tool_pool()
+            pool_settings = pool_config[0]
+            if pool_settings.get('enabled', False) and pool_settings.get('tools'):
+                self.tool_pool = ToolProcessPool(
+                    pool_settings['tools'],
+                    workers=pool_settings.get('workers', 2),
+                    max_memory_mb=pool_settings.get('max_memory_mb', 300),
+                    plugin_dirs=pool_config[1],
+                    overrides=self.functions_config,
+                    startup_timeout=pool_settings.get('startup_timeout_seconds', 30)
+                )
+                # 启动时由preload在后台启动；热重载后立即启动，首次调用不必等待进程启动
+                if reloading:
+                    self.tool_pool.start()
+            self.tool_pool_config = pool_config
 
-        print_debug(f"AI初始化完成，支持{len(self.tools)}个工具")
+        # HTTP连接池设置变化时重建连接池（OpenAI客户端随之重建）
+        http_config = config.get('http', {})
+        connection_changed = self.connection is None or self.connection.http_config != http_config
+        if connection_changed:
+            # 旧连接池可能仍有请求在进行，不主动关闭
+            self.connection = ConnectionManager(http_config)
+            self.connection.on_connection = self.on_connection
 
-    def load_functions_module(self):
-        """动态加载functions模块"""
-        try:
-            # 获取当前执行目录
-            current_dir = os.getcwd()
-            functions_path = os.path.join(current_dir, 'functions.py')
+        # 接口后端：配置了backends时按权重和延迟在多个后端间路由，否则只使用api_base
+        backends = [Backend(
+            name=backend.get('name') or backend.get('api_base', ''),
+            api_base=backend.get('api_base', self.api_base),
+            api_key=backend.get('api_key', self.api_key),
+            model=backend.get('model'),
+            weight=backend.get('weight', 1.0)
+        ) for backend in config.get('backends', [])] or [Backend("default", self.api_base, self.api_key)]
+        router_config = config.get('router', {})
+        resilience_config = config.get('resilience', {})
+        router = Router(
+            backends,
+            hedge_after_ms=router_config.get('hedge_after_ms', 0),
+            ewma_alpha=router_config.get('ewma_alpha', 0.3),
+            failure_penalty_ms=router_config.get('failure_penalty_ms', 5000),
+            failure_threshold=resilience_config.get('failure_threshold', 3),
+            reset_timeout=resilience_config.get('reset_timeout_seconds', 30)
+        )
+        # 地址、密钥和模型不变的后端沿用延迟统计和已创建的客户端
+        router.adopt_stats(self.router)
+        if connection_changed:
+            for backend in backends:
+                backend.client = None
+        self.router = router
 
-            print_debug(f"尝试加载functions模块: {functions_path}")
+        # 容错：本地限流，暂时性错误按指数退避重试（openai自带的重试已关闭）
+        self.rate_limiter = TokenBucket(resilience_config.get('rate_limit_per_minute', 20),
+                                        resilience_config.get('rate_limit_burst', 5))
+        self.rate_limit_wait = resilience_config.get('rate_limit_max_wait_seconds', 10)
+        self.retry_policy = RetryPolicy(resilience_config.get('max_retries', 2),
+                                        resilience_config.get('backoff_base_seconds', 0.5),
+                                        resilience_config.get('backoff_max_seconds', 8))
 
-            if not os.path.exists(functions_path):
-                print_debug("functions.py文件不存在，功能调用将不可用")
-                return None
+        # 录制模式：把真实的请求和回复写入JSONL，供mock_server.py回放
+        recording_config = config.get('recording', {})
+        recording_path = recording_config.get('path', 'recordings.jsonl')
+        if not recording_config.get('enabled', False):
+            self.recorder = None
+        elif not self.recorder or self.recorder.path != recording_path:
+            self.recorder = Recorder(recording_path)
 
-            # 动态导入functions模块
-            import importlib.util
-            spec = importlib.util.spec_from_file_location("functions", functions_path)
-            functions_module = importlib.util.module_from_spec(spec)
+        # 系统提示词，代码块模式下附加调用格式说明
+        system_prompt = self.system_prompt
+        if not self.native_tools and self.json_tool_prompt:
+            system_prompt = f"{system_prompt}\n\n{self.json_tool_prompt}".strip()
 
-            # 将模块添加到sys.modules中，避免重复加载
-            sys.modules["functions"] = functions_module
-            spec.loader.exec_module(functions_module)
+        # 消息历史记录：在token预算内滑动保留最近的轮次，可选把淘汰的轮次压缩成摘要
+        self.context.set_system_prompt(system_prompt)
+        self.context.token_budget = config.get('context_token_budget', 4000)
+        self.context.summarizer = self.summarize_history if config.get('context_summary', False) else None
 
-            print_debug("functions模块加载成功")
-            return functions_module
+        # 准备工具描述
+        self.tools = self.prepare_tools()
+
+    def create_client(self, backend):
+        """为后端创建OpenAI客户端，所有后端共用同一个连接池"""
+        from openai import OpenAI
+        client = OpenAI(api_key=backend.api_key, base_url=backend.api_base,
+                        http_client=self.connection.client, max_retries=0)
+        print_debug(f"OpenAI客户端初始化成功: {backend.name}")
+        return client
 
+    def get_backend_client(self, backend):
+        """后端的OpenAI客户端，首次使用时才导入openai并创建，失败时返回None"""
+        try:
+            return backend.get_client(self.create_client)
         except Exception as e:
-            print_debug(f"加载functions模块失败: {str(e)}")
+            print_debug(f"OpenAI客户端初始化失败: {str(e)}")
             return None
 
+    @property
+    def client(self):
+        """第一个后端的OpenAI客户端（摘要等辅助请求使用）"""
+        return self.get_backend_client(self.router.backends[0])
+
+    def preload(self):
+        """在后台线程中提前加载openai客户端、启动工具进程，并预热到接口的连接"""
+        self.client
+        if self.tool_pool:
+            self.tool_pool.start()
+        print_debug("AI依赖预加载完成")
+        self.warm_up(force=True)
+
+    def warm_up(self, force=False):
+        """预热到接口的连接（阻塞，应在后台线程中调用）
+
+        force为False时，连接最近用过就跳过
+        """
+        if not self.client:
+            return False
+        base_urls = list(dict.fromkeys(backend.api_base for backend in self.router.ordered()))
+        return self.connection.warm_up(base_urls, force)
+
+    def on_connection(self, reused):
+        """记录本轮请求是否复用了连接"""
+        self.turn.count("connections_reused" if reused else "connections_new")
+
     def execute_function(self, function_name, arguments):
-        """执行指定的函数"""
-        if not self.functions_module:
-            return f"错误：functions模块未加载，无法执行函数 '{function_name}'"
+        """执行指定的函数（对应插件模块在首次调用时导入）
 
-        try:
-            # 检查functions模块是否有execute_function方法
-            if hasattr(self.functions_module, 'execute_function'):
-                return self.functions_module.execute_function(function_name, arguments)
-            else:
-                return f"错误：functions模块中没有execute_function方法"
-        except Exception as e:
-            print_debug(f"函数执行失败: {str(e)}")
-            return f"错误：函数执行失败 - {str(e)}"
+        声明了缓存策略的工具先查结果缓存，命中时不再执行
+        """
+        result, hit = self.tool_cache.call(
+            function_name, arguments, lambda: self.run_tool(function_name, arguments))
+        if hit:
+            print_debug(f"命中工具缓存: {function_name}")
+            self.turn.count("tool_cache_hits")
+        elif function_name in self.tool_cache.policies:
+            self.turn.count("tool_cache_misses")
+        return result
+
+    def run_tool(self, function_name, arguments):
+        """执行工具：进程池中的工具交给工作进程，到期未完成时结束该进程；其余在当前线程执行"""
+        if self.tool_pool and function_name in self.tool_pool.tools:
+            timeout = self.tool_timeouts.get(function_name, self.tool_timeout)
+            return self.tool_pool.call(function_name, arguments, timeout)
+        return self.tool_registry.execute(function_name, arguments)
+
+    def close_tool_pool(self):
+        """关闭工具进程池（配置变化和程序退出时调用）"""
+        if self.tool_pool:
+            self.tool_pool.close()
+            self.tool_pool = None
+
+    def timed_execute_function(self, turn, function_name, arguments):
+        """执行函数并把耗时记入本轮（运行在工具线程中）"""
+        with turn.span(f"tool:{function_name}"):
+            result = self.execute_function(function_name, arguments)
+        turn.count("tool_calls")
+        if isinstance(result, str) and result.startswith("错误"):
+            turn.count("tool_errors")
+        return result
+
+    def run_tool_calls(self, tool_calls):
+        """并行执行一轮中的所有工具调用，按原始顺序返回[(call_id, 结果), ...]
+
+        超时的工具不会阻塞本轮，直接以超时错误作为结果
+        """
+        start_time = time.monotonic()
+        pending = []
+        for tool_call in tool_calls:
+            call_id = tool_call.get("id", "unknown")
+            function_name = tool_call.get("function", {}).get("name", "")
+            arguments_str = tool_call.get("function", {}).get("arguments", "{}")
+
+            print_debug(f"执行函数: {function_name}, 参数: {arguments_str}")
+            # 解析函数参数
+            try:
+                arguments = json.loads(arguments_str or "{}")
+            except json.JSONDecodeError:
+                error_msg = f"函数参数解析失败: {arguments_str}"
+                print_debug(error_msg)
+                pending.append((call_id, function_name, None, error_msg))
+                continue
+            future = self.tool_executor.submit(self.timed_execute_function, self.turn, function_name, arguments)
+            pending.append((call_id, function_name, future, None))
+
+        results = []
+        for call_id, function_name, future, error_msg in pending:
+            if future is None:
+                results.append((call_id, error_msg))
+                continue
+            timeout = self.tool_timeouts.get(function_name, self.tool_timeout)
+            wait = timeout
+            if self.tool_pool and function_name in self.tool_pool.tools:
+                # 进程池自己按期限结束超时的调用，但工作进程的启动时间不计入期限，这里为它留出余量
+                wait += self.tool_pool.startup_timeout
+            remaining = max(0, start_time + wait - time.monotonic())
+            try:
+                result = future.result(timeout=remaining)
+            except FutureTimeoutError:
+                future.cancel()
+                self.turn.count("tool_timeouts")
+                result = f"错误：函数 '{function_name}' 执行超时（{timeout}秒）"
+            print_debug(f"函数执行结果: {result}")
+            results.append((call_id, result))
+        return results
 
     def prepare_tools(self):
         """准备工具描述列表"""
-        tools = []
-        for func in self.functions_config:
-            tool = {
+        return self.tool_registry.schemas()
+    
+    def count_usage(self, api_params, content, usage=None):
+        """记录本次调用的token数，接口没有返回usage时按本地估算"""
+        if usage:
+            self.turn.count("prompt_tokens", usage.prompt_tokens or 0)
+            self.turn.count("completion_tokens", usage.completion_tokens or 0)
+            return
+        self.turn.count("prompt_tokens", sum(count_message_tokens(m) for m in api_params["messages"]))
+        self.turn.count("completion_tokens", count_tokens(content))
+
+    def request_completion(self, api_params, on_delta=None, ttfb_span="ttfb"):
+        """经路由调用补全接口，返回(回复内容, 工具调用列表)
+
+        某个后端出错时换下一个后端；所有后端都出现暂时性错误时退避后整体重试；
+        已经展示了部分内容时先通知界面清空
+        """
+        emitted = [False]
+
+        def forward(text, replace=False):
+            emitted[0] = True
+            on_delta(text, replace)
+
+        def attempt(backend, claim):
+            if emitted[0]:
+                on_delta("", replace=True)
+                emitted[0] = False
+            if backend.model:
+                params = dict(api_params, model=backend.model)
+            else:
+                params = api_params
+            return self.backend_completion(backend, params, forward if on_delta else None, ttfb_span, claim)
+
+        stats = self.router.stats()
+        max_retries = self.retry_policy.max_retries
+        try:
+            for retry in range(max_retries + 1):
+                self.rate_limiter.acquire(self.rate_limit_wait)
+                try:
+                    return self.router.run(attempt)
+                except (CircuitOpenError, RateLimitExceeded):
+                    raise
+                except Exception as e:
+                    if retry >= max_retries or not is_transient(e):
+                        raise
+                    delay = self.retry_policy.delay(retry + 1, e)
+                    if delay is None:
+                        raise
+                    self.turn.count("retries")
+                    print_debug(f"请求失败，{delay:.1f}秒后重试: {str(e)}")
+                    self.report_status(f"网络异常，正在重试（{retry + 1}/{max_retries}）")
+                    time.sleep(delay)
+        finally:
+            new_stats = self.router.stats()
+            if new_stats["failovers"] > stats["failovers"]:
+                self.turn.count("failovers", new_stats["failovers"] - stats["failovers"])
+            if new_stats["hedges"] > stats["hedges"]:
+                self.turn.count("hedges", new_stats["hedges"] - stats["hedges"])
+
+    def backend_completion(self, backend, api_params, on_delta=None, ttfb_span="ttfb", claim=None):
+        """向一个后端发起补全请求，返回(回复内容, 工具调用列表)
+
+        流式模式下每收到一段内容就通过on_delta回传，工具调用的片段按index拼接；
+        收到第一个片段时调用claim()，对冲请求已被其他后端抢先时放弃本次请求，
+        其他后端胜出时本次请求的连接会被立即中止
+        """
+        client = self.get_backend_client(backend)
+        if not client:
+            raise RuntimeError(f"后端 {backend.name} 的客户端初始化失败")
+
+        if claim is None or not claim.hedged:
+            return self.read_completion(client, api_params, on_delta, ttfb_span, claim)
+
+        # 对冲请求使用独立的连接，落败时由胜出的一方直接中止，不再等到自己出字或读取超时；
+        # 首个请求仍走共享连接池，复用预热好的连接
+        http_client, cancel = self.connection.create_cancellable_client()
+        claim.on_cancel(cancel)
+        try:
+            return self.read_completion(client.with_options(http_client=http_client),
+                                        api_params, on_delta, ttfb_span, claim)
+        except HedgeLost:
+            raise
+        except Exception:
+            if claim.cancelled:
+                raise HedgeLost() from None
+            raise
+        finally:
+            http_client.close()
+
+    def read_completion(self, client, api_params, on_delta=None, ttfb_span="ttfb", claim=None):
+        """发起一次补全请求并读取结果，返回(回复内容, 工具调用列表)"""
+        start = time.perf_counter()
+        if not (self.stream and on_delta):
+            response = client.chat.completions.create(**api_params)
+            if claim and not claim():
+                raise HedgeLost()
+            message = response.choices[0].message
+            tool_calls = [{
+                "id": tool_call.id,
                 "type": "function",
                 "function": {
-                    "name": func["name"],
-                    "description": func["description"],
-                    "parameters": func["parameters"]
+                    "name": tool_call.function.name,
+                    "arguments": tool_call.function.arguments or "{}"
                 }
-            }
-            tools.append(tool)
-        return tools
-    
-    def send_message(self, user_message):
-        """发送消息给AI并获取回复"""
+            } for tool_call in (message.tool_calls or [])]
+            self.count_usage(api_params, message.content, getattr(response, "usage", None))
+            if self.recorder:
+                self.recorder.record(api_params, message.content or "", tool_calls,
+                                     total_ms=(time.perf_counter() - start) * 1000)
+            return message.content or "", tool_calls
+
+        chunks = []
+        tool_calls = {}
+        usage = None
+        ttfb_ms = None
+        stream = client.chat.completions.create(stream=True, **api_params)
+        for chunk in stream:
+            if ttfb_ms is None:
+                ttfb_ms = (time.perf_counter() - start) * 1000
+                if claim and not claim():
+                    # 落败的对冲请求，关闭连接
+                    stream.close()
+                    raise HedgeLost()
+                self.turn.add_span(ttfb_span, ttfb_ms)
+            usage = getattr(chunk, "usage", None) or usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if delta.content:
+                chunks.append(delta.content)
+                on_delta(delta.content)
+            for tool_delta in (delta.tool_calls or []):
+                tool_call = tool_calls.setdefault(tool_delta.index, {
+                    "id": "",
+                    "type": "function",
+                    "function": {"name": "", "arguments": ""}
+                })
+                if tool_delta.id:
+                    tool_call["id"] = tool_delta.id
+                if tool_delta.function:
+                    if tool_delta.function.name:
+                        tool_call["function"]["name"] += tool_delta.function.name
+                    if tool_delta.function.arguments:
+                        tool_call["function"]["arguments"] += tool_delta.function.arguments
+        if ttfb_ms is None and claim and not claim():
+            # 空回复也要参与对冲的胜负判定
+            raise HedgeLost()
+        content = "".join(chunks)
+        tool_calls = [tool_calls[index] for index in sorted(tool_calls)]
+        self.count_usage(api_params, content, usage)
+        if self.recorder:
+            self.recorder.record(api_params, content, tool_calls, ttfb_ms,
+                                 (time.perf_counter() - start) * 1000)
+        return content, tool_calls
+
+    def get_cache_key(self, api_params):
+        """计算本次请求的缓存键，不应走缓存时返回None
+
+        窗口里有图片，或有副作用工具的执行结果时绕过缓存；
+        请求调用有副作用工具的回复仍可缓存，因为命中后工具依然会真正执行
+        """
+        if not self.response_cache:
+            return None
+
+        if self.cache_context_turns is None:
+            window = api_params["messages"]
+        else:
+            window = self.context.system_messages() + self.context.current_turn(self.cache_context_turns)
+        side_effect_ids = set()
+        for message in window:
+            if isinstance(message.get("content"), list):
+                return None
+            for tool_call in message.get("tool_calls") or []:
+                if tool_call["function"]["name"] in self.side_effect_tools:
+                    side_effect_ids.add(tool_call.get("id"))
+            if message["role"] == "tool" and message.get("tool_call_id") in side_effect_ids:
+                return None
+
+        return make_cache_key(self.model, window, api_params.get("tools"))
+
+    def cached_completion(self, api_params, on_delta=None, ttfb_span="ttfb"):
+        """带回复缓存的补全调用，返回值与request_completion相同"""
+        cache_key = self.get_cache_key(api_params)
+        if cache_key:
+            cached = self.response_cache.get(cache_key)
+            self.turn.count("cache_hits" if cached else "cache_misses")
+            if cached:
+                print_debug(f"命中回复缓存: {self.response_cache.stats()}")
+                content = cached["content"]
+                if on_delta and content:
+                    on_delta(content)
+                # 工具调用id每轮重新生成，避免与历史中的id重复
+                tool_calls = [dict(tool_call, id=f"call_{uuid.uuid4().hex[:24]}")
+                              for tool_call in cached["tool_calls"]]
+                return content, tool_calls
+
+        content, tool_calls = self.request_completion(api_params, on_delta, ttfb_span)
+        if cache_key and (content or tool_calls):
+            self.response_cache.put(cache_key, {"content": content, "tool_calls": tool_calls})
+        return content, tool_calls
+
+    def get_cache_stats(self):
+        """回复缓存的命中统计，未启用缓存时返回None"""
+        return self.response_cache.stats() if self.response_cache else None
+
+    def get_tool_cache_stats(self):
+        """各工具结果缓存的命中统计"""
+        return self.tool_cache.stats()
+
+    def report_status(self, text):
+        """向界面报告简短的状态（重试等）"""
+        if self.on_status:
+            self.on_status(text)
+
+    def health_status(self):
+        """后端熔断状态的简短描述，全部正常时返回空字符串"""
+        unhealthy = [backend for backend in self.router.backends
+                     if backend.breaker.state != CircuitBreaker.CLOSED]
+        if not unhealthy:
+            return ""
+        if len(unhealthy) < len(self.router.backends):
+            return f"{len(unhealthy)}个接口暂不可用"
+        return str(self.router.circuit_open_error())
+
+    def send_message(self, user_message, on_delta=None, on_status=None):
+        """发送消息给AI并获取回复
+
+        on_delta(text, replace=False) 在流式模式下随内容到达被调用，
+        replace为True时表示界面应先清空当前回复再追加text；
+        on_status(text) 在重试等情况下报告简短状态
+        """
         if not self.client:
             return "错误：AI客户端未初始化，请检查API配置"
-        
+        self.on_status = on_status
+
+        # 本轮各阶段的耗时和计数记入指标
+        metrics = get_metrics()
+        self.turn = turn = metrics.begin_turn()
         try:
-            # 添加用户消息到历史
-            self.messages.append({
-                "role": "user", 
-                "content": user_message
-            })
-            print_debug(f"发送用户消息: {user_message}")
-            # 准备API调用参数
-            api_params = {
-                "model": self.model,
-                "messages": self.messages
-            }
-            # 如果有工具，添加到参数中
-            if self.tools:
-                api_params["tools"] = self.tools
+            with turn.span("request_build"):
+                # 添加用户消息到历史
+                self.context.append({
+                    "role": "user",
+                    "content": user_message
+                }, new_turn=True)
+                print_debug(f"发送用户消息: {user_message}")
+                # 准备API调用参数
+                api_params = {
+                    "model": self.model,
+                    "messages": self.context.build()
+                }
+                # 原生工具调用模式下把工具描述随请求发送
+                if self.native_tools and self.tools:
+                    api_params["tools"] = self.tools
             # 第一次API调用
             print_debug("正在调用AI API...")
-            response = self.client.chat.completions.create(**api_params)
-            ai_response = response.choices[0].message.content or ""
+            with turn.span("completion"):
+                ai_response, tool_calls = self.cached_completion(api_params, on_delta)
             print_debug(f"AI原始回复: {ai_response}")
-            if self.get_message_count() >=5:
-                print_debug("消息历史超过5条，清空历史")
-                self.clear_history()
-            # 将AI回复添加到消息历史
-            self.messages.append({
+            # 将AI回复添加到消息历史，工具调用必须随assistant消息一起记录
+            assistant_message = {
                 "role": "assistant",
                 "content": ai_response
-            })
+            }
+            if tool_calls:
+                assistant_message["tool_calls"] = tool_calls
+            self.context.append(assistant_message)
             # 检查是否需要调用工具
-            final_response = self.handle_function_calls(ai_response)
+            final_response = self.handle_function_calls(ai_response, on_delta, tool_calls)
             return final_response
-            
+
+        except CircuitOpenError as e:
+            # 熔断中快速失败，不计入错误
+            turn.count("circuit_rejections")
+            return f"AI处理失败: {str(e)}"
         except Exception as e:
+            turn.count("errors")
             error_msg = f"AI处理失败: {str(e)}"
             print_debug(error_msg)
             return error_msg
-    
-    def handle_function_calls(self, ai_response):
-        """处理AI回复中的函数调用"""
-        # 查找JSON代码块
+        finally:
+            metrics.end_turn(turn)
+
+    def parse_json_tool_calls(self, ai_response):
+        """从回复的```json代码块中解析工具调用（不支持原生工具调用的后端使用）"""
         json_match = re.search(r"```json\s*(.*?)\s*```", ai_response, re.DOTALL)
-        
         if not json_match:
-            # 没有函数调用，直接返回AI回复
-            return ai_response
-        
+            return []
+
+        tool_data = json.loads(json_match.group(1))
+        print_debug(f"发现函数调用: {tool_data}")
+        if not isinstance(tool_data, dict):
+            return []
+        return tool_data.get("tool_calls") or []
+
+    def handle_function_calls(self, ai_response, on_delta=None, tool_calls=None):
+        """执行AI请求的函数调用，并根据结果获取最终回复
+
+        tool_calls为原生工具调用列表；为空且未启用原生模式时，回退到解析```json代码块
+        """
         try:
-            # 解析JSON
-            json_str = json_match.group(1)
-            tool_data = json.loads(json_str)
-            print_debug(f"发现函数调用: {tool_data}")
-            # 检查是否有tool_calls
-            if "tool_calls" not in tool_data or not tool_data["tool_calls"]:
+            if not tool_calls and not self.native_tools:
+                with self.turn.span("tool_parse"):
+                    tool_calls = self.parse_json_tool_calls(ai_response)
+            if not tool_calls:
+                # 没有函数调用，直接返回AI回复
                 return ai_response
-            # 处理每个工具调用
-            for tool_call in tool_data["tool_calls"]:
-                call_id = tool_call.get("id", "unknown")
-                function_name = tool_call.get("function", {}).get("name", "")
-                arguments_str = tool_call.get("function", {}).get("arguments", "{}")
-                
-                print_debug(f"执行函数: {function_name}, 参数: {arguments_str}")
-                # 解析函数参数
-                try:
-                    arguments = json.loads(arguments_str)
-                except json.JSONDecodeError:
-                    error_msg = f"函数参数解析失败: {arguments_str}"
-                    print_debug(error_msg)
-                    # 添加错误信息到消息历史
-                    self.messages.append({
-                        "role": "tool",
-                        "tool_call_id": call_id,
-                        "content": error_msg
-                    })
-                    continue
-                # 执行函数
-                result = self.execute_function(function_name, arguments)
-                print_debug(f"函数执行结果: {result}")
 
+            # 图片消息要放在所有tool消息之后，避免打断工具结果序列
+            image_messages = []
+            # 并行执行所有工具调用，结果按调用顺序写回
+            with self.turn.span("tools"):
+                results = self.run_tool_calls(tool_calls)
+            for call_id, result in results:
                 # 检查是否是图片分析结果
                 if isinstance(result, dict) and result.get("type") == "image_for_ai":
                     # 这是图片数据，需要特殊处理
                     print_debug("检测到图片数据，准备发送给AI分析")
 
                     # 添加函数结果到消息历史（简化版本）
-                    self.messages.append({
+                    self.context.append({
                         "role": "tool",
                         "tool_call_id": call_id,
                         "content": result.get("message", "截图完成")
                     })
 
                     # 准备包含图片的用户消息
-                    image_message = {
+                    image_messages.append({
                         "role": "user",
                         "content": [
                             {
@@ -227,39 +649,45 @@ class AI:
                             {
                                 "type": "image_url",
                                 "image_url": {
-                                    "url": result["data_url"]
+                                    "url": result["data_url"],
+                                    "detail": result.get("detail", "auto")
                                 }
                             }
                         ]
-                    }
-
-                    # 将图片消息添加到历史中
-                    self.messages.append(image_message)
-                    print_debug("已添加图片消息到对话历史")
+                    })
 
                 else:
                     # 普通函数结果，按原来的方式处理
-                    self.messages.append({
+                    self.context.append({
                         "role": "tool",
                         "tool_call_id": call_id,
                         "content": str(result)
                     })
+
+            # 将图片消息添加到历史中
+            if image_messages:
+                self.context.extend(image_messages)
+                print_debug("已添加图片消息到对话历史")
             
             # 第二次API调用，让AI根据函数结果给出最终回复
             print_debug("正在获取AI最终回复...")
-            final_response = self.client.chat.completions.create(
-                model=self.model,
-                messages=self.messages
-            )
-            
-            final_ai_response = final_response.choices[0].message.content or ""
+            if on_delta:
+                # 第一次回复中的内容不再需要展示，清空后显示最终回复
+                on_delta("", replace=True)
+            api_params = {
+                "model": self.model,
+                "messages": self.context.build()
+            }
+            if self.native_tools and self.tools:
+                # 历史中包含工具调用，需要带上工具描述，但本轮不允许再次调用
+                api_params["tools"] = self.tools
+                api_params["tool_choice"] = "none"
+            with self.turn.span("second_completion"):
+                final_ai_response, _ = self.cached_completion(api_params, on_delta, "second_ttfb")
             print_debug(f"AI最终回复: {final_ai_response}")
 
-            if self.get_message_count() >=5:
-                print_debug("消息历史超过5条，清空历史")
-                self.clear_history()
             # 添加最终回复到消息历史
-            self.messages.append({
+            self.context.append({
                 "role": "assistant",
                 "content": final_ai_response
             })
@@ -267,25 +695,73 @@ class AI:
             return final_ai_response
             
         except json.JSONDecodeError as e:
+            self.turn.count("errors")
             print_debug(f"JSON解析错误: {str(e)}")
             # JSON解析失败，返回原始回复
             return ai_response
         except Exception as e:
+            self.turn.count("errors")
             error_msg = f"函数调用处理失败: {str(e)}"
             print_debug(error_msg)
             return f"{ai_response}\n\n{error_msg}"
     
+    def summarize_history(self, summary, evicted_messages):
+        """把被淘汰的对话压缩进滚动摘要"""
+        lines = []
+        for message in evicted_messages:
+            if message["role"] in ("user", "assistant") and isinstance(message.get("content"), str):
+                if message["content"]:
+                    lines.append(f"{message['role']}: {message['content']}")
+        if not lines:
+            return summary
+
+        try:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=[{
+                    "role": "user",
+                    "content": "请把已有摘要和下面的对话合并成不超过200字的摘要，只保留后续对话可能用到的信息。\n\n"
+                               f"已有摘要：{summary or '无'}\n\n对话：\n" + "\n".join(lines)
+                }]
+            )
+            new_summary = response.choices[0].message.content or summary
+            print_debug(f"对话摘要已更新: {new_summary}")
+            return new_summary
+        except Exception as e:
+            print_debug(f"对话摘要生成失败: {str(e)}")
+            return summary
+
+    def set_store(self, store):
+        """设置对话记录存储，之后的每条消息都会被记录"""
+        self.context.on_append = store.append if store else None
+
+    def restore_history(self, rows):
+        """用存储中最近的记录恢复上下文 rows: [(id, role, content, created_at)]
+
+        已经开始新对话时不再恢复，避免打乱消息顺序
+        """
+        if self.context.messages:
+            return
+        for _, role, content, _ in rows:
+            if role in ("user", "assistant") and content:
+                self.context.append({"role": role, "content": content},
+                                    new_turn=(role == "user"), notify=False)
+        print_debug(f"已恢复{self.get_message_count()}条历史消息")
+
+    @property
+    def messages(self):
+        """当前保留的消息历史（不含系统提示词）"""
+        return self.context.messages
+
     def get_message_count(self):
         """获取消息历史数量"""
-        return len(self.messages)
+        return len(self.context.messages)
     
     def clear_history(self):
         """清空消息历史（保留系统提示词）"""
-        # 保留系统提示词
-        system_messages = [msg for msg in self.messages if msg["role"] == "system"]
-        self.messages = system_messages
+        self.context.clear()
         print_debug("消息历史已清空")
 
     def get_last_messages(self, count=5):
         """获取最近的几条消息"""
-        return self.messages[-count:] if len(self.messages) >= count else self.messages
+        return self.context.messages[-count:]
@@ -0,0 +1,311 @@
+# 性能基准测试
+# 无界面运行：QT_QPA_PLATFORM=offscreen python benchmark.py --output bench.json
+# 结果以JSON输出，便于在版本之间比较
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+# 资源和config.json都按相对路径查找，先切换到程序目录
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+def summarize(samples):
+    """把一组耗时（秒）汇总为微秒统计"""
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "mean_us": statistics.fmean(ordered) * 1e6,
+        "p50_us": ordered[len(ordered) // 2] * 1e6,
+        "p95_us": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1e6,
+        "max_us": ordered[-1] * 1e6
+    }
+
+def timed(fn, repeat):
+    """重复执行fn并返回每次的耗时"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+_app = None
+
+def get_app():
+    """共享的QApplication"""
+    global _app
+    from PyQt6.QtWidgets import QApplication
+    _app = QApplication.instance() or QApplication(sys.argv[:1])
+    return _app
+
+def start_fake_server():
+    """在后台线程启动零延迟的模拟接口，返回(server, api_base)"""
+    from mock_server import MockBackend, start_server
+    return start_server(MockBackend(chunk_chars=4))
+
+def make_ai(api_base, **overrides):
+    """创建指向假接口、关闭缓存、摘要和限流的AI实例"""
+    from ai import AI
+    from config import get_config
+
+    config = dict(get_config().data)
+    config.update({
+        "api_key": "bench",
+        "api_base": api_base,
+        "model": "fake-model",
+        "response_cache": {"enabled": False},
+        "context_summary": False,
+        "resilience": {"rate_limit_per_minute": 0}
+    })
+    config.update(overrides)
+    return AI(config)
+
+def bench_pet_set_state(repeat):
+    """Pet.set_state在不同状态之间切换的耗时"""
+    from config import get_config
+    from pet import Pet
+
+    get_app()
+    pet = Pet(get_config())
+    states = list(get_config().pet_states) or ["idle"]
+    pet.animation_cache.preload()
+
+    index = [0]
+    def switch():
+        index[0] += 1
+        pet.set_state(states[index[0] % len(states)])
+
+    result = summarize(timed(switch, repeat))
+    pet.close()
+    return result
+
+def synthetic_animation(frame_count=8, size=120, sprite_size=24):
+    """合成一个多帧动画：透明背景上一个小色块沿对角线移动，每帧只有一小块区域变化"""
+    from PyQt6.QtCore import Qt
+    from PyQt6.QtGui import QColor, QImage, QPainter, QPixmap
+    from pet import Animation
+    from sprite import frame_damage
+
+    images = []
+    step = (size - sprite_size) // max(1, frame_count - 1)
+    for index in range(frame_count):
+        image = QImage(size, size, QImage.Format.Format_ARGB32_Premultiplied)
+        image.fill(Qt.GlobalColor.transparent)
+        painter = QPainter(image)
+        painter.fillRect(index * step, index * step, sprite_size, sprite_size, QColor(255, 160, 0))
+        painter.end()
+        images.append(image)
+    damage = [frame_damage(images[index - 1], image) for index, image in enumerate(images)]
+    return Animation([QPixmap.fromImage(image) for image in images], [100] * frame_count, damage)
+
+def measure_sprite_paint(app, animation, repeat):
+    """对一个动画分别用QLabel整帧重绘和SpriteView局部重绘逐帧播放，返回两者的耗时"""
+    from PyQt6.QtWidgets import QLabel
+    from PyQt6.QtCore import Qt
+    from sprite import SpriteView
+
+    count = len(animation.frames)
+    label = QLabel()
+    label.setAttribute(Qt.WidgetAttribute.WA_TranslucentBackground)
+    label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+    label.resize(150, 150)
+    label.show()
+    sprite = SpriteView()
+    sprite.setAttribute(Qt.WidgetAttribute.WA_TranslucentBackground)
+    sprite.resize(150, 150)
+    sprite.show()
+
+    # 两者都只提交更新请求，由事件循环完成绘制
+    index = [0]
+    def paint_label():
+        index[0] = (index[0] + 1) % count
+        label.setPixmap(animation.frames[index[0]])
+        app.processEvents()
+
+    def paint_sprite():
+        previous = index[0]
+        index[0] = (index[0] + 1) % count
+        sprite.set_frame(animation.frames[index[0]], animation.damage_between(previous, index[0]))
+        app.processEvents()
+
+    frame_area = animation.frames[0].width() * animation.frames[0].height()
+    damaged_area = sum(rect.width() * rect.height() for rect in animation.damage) / count
+    result = {
+        "frames": count,
+        "damage_fraction": round(damaged_area / frame_area, 3),
+        "qlabel_full": summarize(timed(paint_label, repeat)),
+        "sprite_damage": summarize(timed(paint_sprite, repeat))
+    }
+    label.close()
+    sprite.close()
+    return result
+
+def bench_sprite_paint(repeat):
+    """逐帧绘制宠物动画的耗时：QLabel整帧重绘对比SpriteView只重绘变化区域
+
+    配置中的动画都只有一帧时（单帧没有帧间变化可比较），改用合成的多帧动画测量
+    """
+    from config import get_config
+    from pet import AnimationCache
+
+    app = get_app()
+    cache = AnimationCache(get_config().pet_states)
+    result = {}
+    for state_name in get_config().pet_states:
+        animation = cache.get(state_name)
+        if animation and len(animation.frames) >= 2:
+            result[state_name] = measure_sprite_paint(app, animation, repeat)
+    if not result:
+        result["synthetic"] = measure_sprite_paint(app, synthetic_animation(), repeat)
+    return result
+
+def bench_chat_add_message(repeat):
+    """Chat.add_message随历史增长的耗时（含一次事件处理，使排版生效）"""
+    from chat import Chat
+
+    app = get_app()
+    chat = Chat()
+    chat.show()
+    checkpoints = sorted({100, 1000, repeat})
+    result = {}
+    count = 0
+    samples = []
+    for checkpoint in checkpoints:
+        while count < checkpoint:
+            role = "user" if count % 2 == 0 else "assistant"
+            start = time.perf_counter()
+            chat.add_message(role, f"第{count}条消息，用来测量追加的开销。" * (1 + count % 3))
+            app.processEvents()
+            samples.append(time.perf_counter() - start)
+            count += 1
+        result[f"at_{checkpoint}"] = summarize(samples[-min(100, len(samples)):])
+    chat.hide()
+    return result
+
+def bench_ai_send_message(repeat):
+    """AI.send_message对本地假接口的往返耗时（非流式与流式）"""
+    server, api_base = start_fake_server()
+    try:
+        result = {}
+        for stream in (False, True):
+            ai_manager = make_ai(api_base, stream=stream)
+            on_delta = (lambda text, replace=False: None) if stream else None
+            ai_manager.send_message("热身", on_delta)
+            result["stream" if stream else "blocking"] = summarize(
+                timed(lambda: ai_manager.send_message("你好", on_delta), repeat))
+        return result
+    finally:
+        server.shutdown()
+
+def bench_tool_calls(repeat):
+    """工具调用的解析和执行调度开销（工具本身为空操作）"""
+    ai_manager = make_ai("http://127.0.0.1:9/v1")
+    ai_manager.execute_function = lambda name, arguments: "成功"
+    reply = "我来帮你查一下。\n```json\n" + json.dumps({"tool_calls": [
+        {"id": str(i), "type": "function",
+         "function": {"name": "weather", "arguments": json.dumps({"city": f"城市{i}"})}}
+        for i in range(3)
+    ]}, ensure_ascii=False) + "\n```\n" + "稍等片刻。" * 20
+    tool_calls = ai_manager.parse_json_tool_calls(reply)
+    return {
+        "parse_json": summarize(timed(lambda: ai_manager.parse_json_tool_calls(reply), repeat)),
+        "run_tool_calls": summarize(timed(lambda: ai_manager.run_tool_calls(tool_calls), repeat))
+    }
+
+def bench_capture_encoding(repeat):
+    """截图缩放和编码的耗时与体积（使用合成的4K图片）"""
+    from PIL import Image
+    from plugins.capture_screen import encode_screenshot
+
+    width, height = 3840, 2160
+    # 渐变加噪声，接近真实屏幕内容的可压缩性
+    base = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    noise = Image.effect_noise((width, height), 40).convert("RGB")
+    source = Image.blend(base, noise, 0.3)
+
+    result = {}
+    for name, screenshot_config in (
+            ("png_full", {"format": "png", "max_width": width, "max_height": height}),
+            ("jpeg_1280", {"format": "jpeg", "quality": 70, "max_width": 1280, "max_height": 1280}),
+            ("webp_1280", {"format": "webp", "quality": 70, "max_width": 1280, "max_height": 1280})):
+        sizes = []
+        def encode():
+            data_url, _ = encode_screenshot(source.copy(), screenshot_config)
+            sizes.append(len(data_url))
+        stats = summarize(timed(encode, max(1, repeat // 10)))
+        stats["payload_bytes"] = sizes[-1]
+        result[name] = stats
+    return result
+
+def bench_startup(repeat):
+    """启动到宠物窗口可见的耗时（子进程运行main.py --startup-check，解析其输出的阶段耗时）
+
+    只统计“宠物窗口可见”这一阶段，不包括之后创建聊天窗口、AI和托盘以及进程退出的时间
+    """
+    samples = []
+    exit_codes = []
+    for _ in range(max(1, repeat // 100)):
+        process = subprocess.run([sys.executable, "main.py", "--startup-check"],
+                                 capture_output=True, text=True, encoding="utf-8", timeout=60)
+        exit_codes.append(process.returncode)
+        for line in reversed(process.stdout.splitlines()):
+            if line.startswith("{"):
+                visible_ms = json.loads(line)["startup_ms"].get("宠物窗口可见")
+                if visible_ms is not None:
+                    samples.append(visible_ms / 1000)
+                break
+    if not samples:
+        return {"error": "main.py --startup-check没有输出启动耗时", "exit_codes": exit_codes}
+    result = summarize(samples)
+    result["within_budget"] = all(code == 0 for code in exit_codes)
+    return result
+
+BENCHMARKS = {
+    "pet_set_state": bench_pet_set_state,
+    "sprite_paint": bench_sprite_paint,
+    "chat_add_message": bench_chat_add_message,
+    "ai_send_message": bench_ai_send_message,
+    "tool_calls": bench_tool_calls,
+    "capture_encoding": bench_capture_encoding,
+    "startup": bench_startup,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="桌宠性能基准测试")
+    parser.add_argument("--output", help="结果JSON文件路径，默认输出到标准输出")
+    parser.add_argument("--only", nargs="*", choices=sorted(BENCHMARKS), help="只运行指定的测试")
+    parser.add_argument("--repeat", type=int, default=200, help="每项测试的重复次数")
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.only or BENCHMARKS:
+        print(f"运行 {name} ...", file=sys.stderr)
+        try:
+            results[name] = BENCHMARKS[name](args.repeat)
+        except ImportError as e:
+            results[name] = {"skipped": f"缺少依赖: {str(e)}"}
+        except Exception as e:
+            results[name] = {"error": f"{type(e).__name__}: {str(e)}"}
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": results
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
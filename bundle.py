@@ -0,0 +1,263 @@
+# 资源包模块
+# 构建步骤把assets目录下的GIF和图标打包成一个文件（头部带索引：名称、偏移、大小、帧信息），
+# 运行时整个文件只做一次内存映射，宠物动画和托盘图标直接从内存读取，不再逐个文件探测路径
+# assets目录中的散文件优先于资源包，用户替换皮肤时只需放入同名文件
+#
+# 打包：python bundle.py [-o assets.bundle]
+# 打包后的程序只需附带assets.bundle，不必再附带assets目录
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+from pathlib import Path
+
+from config import get_config
+
+MAGIC = b"PETASSET"
+VERSION = 1
+# 头部：魔数、版本号、索引长度，之后是JSON索引和各文件数据
+HEADER = struct.Struct("<8sII")
+BUNDLE_NAME = "assets.bundle"
+ASSETS_DIR = "assets"
+
+def print_debug(message):
+    """打印调试信息"""
+    if get_config().debug:
+        print(f"[BUNDLE DEBUG] {message}")
+
+def get_resource_path(relative_path):
+    """获取资源文件的正确路径，兼容开发环境和打包后的环境，找不到时返回None"""
+    if hasattr(sys, '_MEIPASS'):
+        # 打包后的环境
+        base_path = Path(sys._MEIPASS)
+    else:
+        # 开发环境
+        base_path = Path(__file__).parent
+
+    paths_to_try = [
+        base_path / relative_path,  # 打包后的路径
+        base_path / '..' / relative_path,  # 开发环境路径
+        Path(relative_path)  # 相对路径
+    ]
+    for path in paths_to_try:
+        if path.exists():
+            return str(path)
+    return None
+
+def normalize_name(name):
+    """统一资源名称的写法：正斜杠、去掉开头的./"""
+    name = name.replace("\\", "/")
+    while name.startswith("./"):
+        name = name[2:]
+    return name
+
+def skip_sub_blocks(data, pos):
+    """跳过GIF的数据子块序列，返回结束符之后的位置"""
+    while pos < len(data) and data[pos]:
+        pos += data[pos] + 1
+    return pos + 1
+
+def gif_info(data):
+    """不解码像素，只扫描GIF的块结构，取出尺寸、帧数和每帧延迟（毫秒）"""
+    width, height, flags = struct.unpack_from("<HHB", data, 6)
+    pos = 13
+    if flags & 0x80:  # 全局颜色表
+        pos += 3 * (2 << (flags & 0x07))
+    delays = []
+    delay = 0
+    while pos < len(data):
+        block = data[pos]
+        if block == 0x21:  # 扩展块
+            label = data[pos + 1]
+            pos += 2
+            if label == 0xF9 and data[pos] >= 4:  # 图形控制扩展，延迟单位是1/100秒
+                delay = struct.unpack_from("<H", data, pos + 2)[0] * 10
+            pos = skip_sub_blocks(data, pos)
+        elif block == 0x2C:  # 图像描述符
+            delays.append(delay)
+            delay = 0
+            flags = data[pos + 9]
+            pos += 10
+            if flags & 0x80:  # 局部颜色表
+                pos += 3 * (2 << (flags & 0x07))
+            pos = skip_sub_blocks(data, pos + 1)  # 跳过LZW最小码长和图像数据
+        else:  # 0x3B结束符，或者无法识别的数据
+            break
+    return {"width": width, "height": height, "frames": len(delays), "delays": delays}
+
+def image_info(name, data):
+    """资源的帧信息，无法识别的格式只记录为1帧"""
+    try:
+        if data[:6] in (b"GIF87a", b"GIF89a"):
+            return gif_info(data)
+        if data[:8] == b"\x89PNG\r\n\x1a\n":
+            width, height = struct.unpack_from(">II", data, 16)
+            return {"width": width, "height": height, "frames": 1}
+    except (IndexError, struct.error):
+        print(f"警告：{name} 的图片结构不完整")
+    return {"frames": 1}
+
+def build_bundle(files, output):
+    """把files（资源名称 -> 文件路径）打包成output，返回索引"""
+    index = {}
+    blobs = []
+    offset = 0
+    for name, path in files.items():
+        with open(path, 'rb') as f:
+            data = f.read()
+        entry = {"offset": offset, "size": len(data)}
+        entry.update(image_info(name, data))
+        index[normalize_name(name)] = entry
+        blobs.append(data)
+        offset += len(data)
+
+    index_bytes = json.dumps({"files": index}, ensure_ascii=False).encode('utf-8')
+    with open(output, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(index_bytes)))
+        f.write(index_bytes)
+        for data in blobs:
+            f.write(data)
+    return index
+
+class AssetBundle:
+    """只读的资源包，整个文件内存映射，按索引切片读取"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, index_size = HEADER.unpack_from(self.map, 0)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"不支持的资源包格式（版本{version}）")
+            data_start = HEADER.size + index_size
+            self.index = json.loads(self.map[HEADER.size:data_start].decode('utf-8'))["files"]
+        except Exception:
+            self.map.close()
+            raise
+        # 索引中的偏移从数据区开始计算
+        self.data_start = data_start
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def read(self, name):
+        """读取一个资源的内容，不存在时返回None"""
+        entry = self.index.get(name)
+        if entry is None:
+            return None
+        start = self.data_start + entry["offset"]
+        return self.map[start:start + entry["size"]]
+
+    def close(self):
+        self.map.close()
+
+class AssetStore:
+    """资源读取：先查assets目录中的散文件，再查资源包
+
+    散文件列表在创建时用一次目录扫描得到，之后的查询都不再访问文件系统；
+    不在assets目录中的路径（例如自定义皮肤的绝对路径）按原来的方式查找
+    """
+
+    def __init__(self, bundle_path=None, loose_dir=None):
+        self.bundle = None
+        if bundle_path:
+            try:
+                self.bundle = AssetBundle(bundle_path)
+                print_debug(f"已加载资源包: {bundle_path}（{len(self.bundle.index)}个文件）")
+            except (OSError, ValueError) as e:
+                print(f"资源包加载失败，改用散文件: {str(e)}")
+
+        self.loose = {}
+        if loose_dir:
+            with os.scandir(loose_dir) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        self.loose[f"{ASSETS_DIR}/{entry.name}"] = entry.path
+
+    def available(self):
+        """是否有资源可用（资源包或assets目录）"""
+        return self.bundle is not None or bool(self.loose)
+
+    def find_file(self, name):
+        """资源对应的散文件路径，没有时返回None"""
+        if name in self.loose:
+            return self.loose[name]
+        if name.startswith(f"{ASSETS_DIR}/") and "/" not in name[len(ASSETS_DIR) + 1:]:
+            # assets目录已经扫描过，不必再探测
+            return None
+        return get_resource_path(name)
+
+    def exists(self, name):
+        name = normalize_name(name)
+        return self.find_file(name) is not None or (self.bundle is not None and name in self.bundle)
+
+    def info(self, name):
+        """资源包索引中记录的尺寸和帧信息（宠物动画缓存用它在解码前估算占用），散文件或不在包中时返回None"""
+        name = normalize_name(name)
+        if self.bundle is None or name in self.loose:
+            return None
+        return self.bundle.index.get(name)
+
+    def read(self, name):
+        """读取资源内容（bytes），找不到时返回None"""
+        name = normalize_name(name)
+        path = self.find_file(name)
+        if path is not None:
+            try:
+                with open(path, 'rb') as f:
+                    return f.read()
+            except OSError as e:
+                print_debug(f"读取失败: {path}: {str(e)}")
+        if self.bundle is not None:
+            return self.bundle.read(name)
+        return None
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_asset_store():
+    """全程序共享的资源读取对象"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                loose_dir = get_resource_path(ASSETS_DIR)
+                _store = AssetStore(get_resource_path(BUNDLE_NAME),
+                                    loose_dir if loose_dir and os.path.isdir(loose_dir) else None)
+    return _store
+
+def main():
+    """打包assets目录（以及config.json中assets目录以外的pet_states文件）"""
+    parser = argparse.ArgumentParser(description="打包宠物资源文件")
+    parser.add_argument("-o", "--output", default=str(Path(__file__).parent / BUNDLE_NAME),
+                        help="输出文件路径")
+    parser.add_argument("--assets", default=str(Path(__file__).parent / ASSETS_DIR),
+                        help="assets目录")
+    args = parser.parse_args()
+
+    files = {}
+    for entry in sorted(os.scandir(args.assets), key=lambda entry: entry.name):
+        if entry.is_file():
+            files[f"{ASSETS_DIR}/{entry.name}"] = entry.path
+    for state_name, path in get_config().get('pet_states', {}).items():
+        name = normalize_name(path)
+        if name not in files:
+            found = get_resource_path(path)
+            if found is None:
+                print(f"警告：找不到 {state_name} 状态的图片: {path}")
+                continue
+            files[name] = found
+
+    index = build_bundle(files, args.output)
+    total = sum(entry["size"] for entry in index.values())
+    print(f"已打包{len(index)}个文件（{total / 1024:.0f}KB）到 {args.output}")
+    for name, entry in index.items():
+        print(f"  {name}: {entry['size']}字节，{entry['frames']}帧")
+
+if __name__ == "__main__":
+    main()
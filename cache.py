@@ -0,0 +1,259 @@
+# 缓存模块
+# AI回复缓存：内存LRU + 可选SQLite持久化的精确匹配缓存，命中时省掉一次完整的API往返
+# 工具结果缓存：按config.json中每个工具声明的策略缓存执行结果
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+def normalize_text(text):
+    """归一化文本：去掉首尾空白并合并连续空白"""
+    return " ".join(str(text).split())
+
+def normalize_message(message):
+    """归一化单条消息，忽略工具调用id等每次都会变化的字段"""
+    normalized = {"role": message.get("role", "")}
+    content = message.get("content")
+    if isinstance(content, list):
+        normalized["content"] = [normalize_text(part.get("text", "")) for part in content
+                                 if part.get("type") == "text"]
+    elif content:
+        normalized["content"] = normalize_text(content)
+    if message.get("tool_calls"):
+        normalized["tool_calls"] = [
+            [tool_call["function"]["name"], normalize_text(tool_call["function"]["arguments"])]
+            for tool_call in message["tool_calls"]
+        ]
+    return normalized
+
+def make_cache_key(model, messages, tools=None):
+    """由模型、归一化后的消息窗口和工具描述生成缓存键"""
+    payload = json.dumps({
+        "model": model,
+        "messages": [normalize_message(message) for message in messages],
+        "tools": tools or []
+    }, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """AI回复缓存
+
+    内存层按LRU淘汰，磁盘层（SQLite）在重启后仍然有效，每条记录带过期时间
+    """
+
+    def __init__(self, max_entries=256, ttl_seconds=3600, db_path=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.memory = OrderedDict()  # key -> (过期时间, 值)
+        self.lock = threading.Lock()
+
+        # 命中统计
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        # 数据库在第一次读写时才打开，启动时不创建文件
+        self.db_path = db_path
+        self.db = None
+
+    def connect(self):
+        """打开磁盘层（调用方需持有锁），没有配置或打开失败时返回None，之后只用内存层"""
+        if self.db is None and self.db_path:
+            db = None
+            try:
+                db = sqlite3.connect(self.db_path, check_same_thread=False)
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+                )
+                db.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+                db.commit()
+                self.db = db
+            except sqlite3.Error as e:
+                if db is not None:
+                    db.close()
+                print(f"回复缓存数据库打开失败，只使用内存缓存: {str(e)}")
+                self.db_path = None
+        return self.db
+
+    def get(self, key):
+        """查询缓存，未命中或已过期返回None"""
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry and entry[0] >= now:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry:
+                del self.memory[key]
+
+            db = self.connect()
+            if db:
+                row = db.execute(
+                    "SELECT value, expires_at FROM responses WHERE key = ? AND expires_at >= ?",
+                    (key, now)
+                ).fetchone()
+                if row:
+                    value = json.loads(row[0])
+                    self._remember(key, value, row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    def put(self, key, value, ttl_seconds=None):
+        """写入缓存"""
+        expires_at = time.time() + (ttl_seconds or self.ttl_seconds)
+        with self.lock:
+            self._remember(key, value, expires_at)
+            db = self.connect()
+            if db:
+                db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), expires_at)
+                )
+                db.commit()
+
+    def _remember(self, key, value, expires_at):
+        """写入内存层并按LRU淘汰（调用方需持有锁）"""
+        self.memory[key] = (expires_at, value)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def clear(self):
+        """清空缓存"""
+        with self.lock:
+            self.memory.clear()
+            db = self.connect()
+            if db:
+                db.execute("DELETE FROM responses")
+                db.commit()
+
+    def stats(self):
+        """命中统计"""
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self.memory)
+            }
+
+class ToolCache:
+    """工具结果缓存
+
+    每个工具的策略来自functions中的cache项：
+      ttl_seconds  结果有效期，0或"none"表示不缓存
+      key          参与缓存键的参数名列表，省略时使用全部参数
+      max_entries  该工具最多保留的结果数，超出时按LRU淘汰
+    错误结果（以“错误”开头的字符串）不缓存；同一键的并发调用只执行一次，其余等待其结果
+    """
+
+    def __init__(self):
+        self.policies = {}  # 工具名 -> 策略
+        self.entries = {}  # 工具名 -> OrderedDict(key -> (过期时间, 结果))
+        self.inflight = {}  # (工具名, key) -> Future
+        self.counters = {}  # 工具名 -> 命中统计
+        self.lock = threading.Lock()
+
+    def configure(self, policies):
+        """设置各工具的缓存策略，策略没有变化的工具保留已缓存的结果"""
+        normalized = {}
+        for name, policy in policies.items():
+            if not isinstance(policy, dict):
+                continue
+            ttl = policy.get('ttl_seconds', 0)
+            if ttl == 'none' or ttl <= 0:
+                continue
+            normalized[name] = {
+                "ttl_seconds": ttl,
+                "key": policy.get('key'),
+                "max_entries": max(1, policy.get('max_entries', 32))
+            }
+        with self.lock:
+            for name in list(self.entries):
+                if normalized.get(name) != self.policies.get(name):
+                    del self.entries[name]
+            self.policies = normalized
+
+    def make_key(self, policy, arguments):
+        """由策略指定的参数生成缓存键，字符串参数会去掉多余空白"""
+        names = policy["key"] if policy["key"] is not None else sorted(arguments)
+        values = {name: normalize_text(arguments[name]) if isinstance(arguments.get(name), str)
+                  else arguments.get(name) for name in names}
+        return json.dumps(values, ensure_ascii=False, sort_keys=True)
+
+    def call(self, name, arguments, function):
+        """按工具的策略查询缓存，未命中时调用function()执行工具，返回(结果, 是否命中)"""
+        policy = self.policies.get(name)
+        if policy is None:
+            return function(), False
+
+        key = self.make_key(policy, arguments)
+        with self.lock:
+            counters = self.counters.setdefault(name, {"hits": 0, "misses": 0, "shared": 0, "evictions": 0})
+            entries = self.entries.setdefault(name, OrderedDict())
+            entry = entries.get(key)
+            if entry and entry[0] >= time.monotonic():
+                entries.move_to_end(key)
+                counters["hits"] += 1
+                return entry[1], True
+            if entry:
+                del entries[key]
+            future = self.inflight.get((name, key))
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self.inflight[(name, key)] = future
+                counters["misses"] += 1
+            else:
+                counters["shared"] += 1
+
+        # 相同参数的调用正在执行，等待它的结果
+        if not is_owner:
+            return future.result(), True
+
+        try:
+            result = function()
+        except BaseException as e:
+            with self.lock:
+                del self.inflight[(name, key)]
+            future.set_exception(e)
+            raise
+        with self.lock:
+            del self.inflight[(name, key)]
+            if not (isinstance(result, str) and result.startswith("错误")) and self.policies.get(name) == policy:
+                entries = self.entries.setdefault(name, OrderedDict())
+                entries[key] = (time.monotonic() + policy["ttl_seconds"], result)
+                entries.move_to_end(key)
+                while len(entries) > policy["max_entries"]:
+                    entries.popitem(last=False)
+                    counters["evictions"] += 1
+        future.set_result(result)
+        return result, False
+
+    def clear(self):
+        """清空缓存的结果"""
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        """各工具的命中统计"""
+        with self.lock:
+            result = {}
+            for name, counters in self.counters.items():
+                total = counters["hits"] + counters["misses"]
+                result[name] = dict(counters,
+                                    hit_rate=counters["hits"] / total if total else 0.0,
+                                    entries=len(self.entries.get(name, ())))
+            return result
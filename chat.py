@@ -1,25 +1,19 @@
 # 聊天窗口模块
 
-from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QTextEdit,
+import html
+import time
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout,
                            QLineEdit, QPushButton, QLabel, QFrame)
-from PyQt6.QtCore import Qt, QEvent, QTimer
-from PyQt6.QtGui import QFont
+from PyQt6.QtCore import Qt, QEvent
 
-# 从config.json读取debug配置
-def load_debug_config():
-    """从config.json加载debug配置"""
-    try:
-        with open('config.json', 'r', encoding='utf-8') as f:
-            config = json.load(f)
-            return config.get('debug', False)
-    except Exception:
-        return False
-
-DEBUG = load_debug_config()
+from chat_view import ChatHistoryView
+from config import get_config
+from metrics import get_metrics
+from worker import Worker, start_worker
 
 def print_debug(message):
     """打印调试信息"""
-    if DEBUG:
+    if get_config().debug:
         print(f"[CHAT DEBUG] {message}")
 
 class Chat(QDialog):
@@ -33,6 +27,21 @@ class Chat(QDialog):
         
         # 宠物窗口引用（稍后设置）
         self.pet_window = None
+
+        # 正在执行的AI后台任务和连接预热任务
+        self.ai_worker = None
+        self.warm_up_worker = None
+
+        # 对话记录存储（稍后设置），以及聊天窗口中已加载的最早一条记录的id
+        self.store = None
+        self.oldest_history_id = None
+        self.search_worker = None
+
+        # 是否正在显示流式回复，以及已收到的内容
+        self.streaming = False
+        self.stream_text = ""
+        # 本轮回复在界面上渲染的累计耗时（秒），回复结束后记入指标
+        self.render_seconds = 0.0
         
         # 设置窗口
         self.setup_window()
@@ -83,6 +92,16 @@ class Chat(QDialog):
             font-family: 'Microsoft YaHei', Arial;
         """)
         title_layout.addWidget(title_label)
+
+        # 接口状态（重试中、熔断等），正常时隐藏
+        self.status_label = QLabel()
+        self.status_label.setStyleSheet("""
+            color: #d9534f;
+            font-size: 11px;
+            font-family: 'Microsoft YaHei', Arial;
+        """)
+        self.status_label.hide()
+        title_layout.addWidget(self.status_label)
         title_layout.addStretch()
         
         # 关闭按钮
@@ -102,26 +121,32 @@ class Chat(QDialog):
             }
         """)
         close_button.clicked.connect(self.hide)
+
+        # 搜索按钮，切换搜索框的显示
+        search_button = QPushButton("搜")
+        search_button.setStyleSheet(close_button.styleSheet().replace("font-size: 20px;", "font-size: 12px;"))
+        search_button.clicked.connect(self.toggle_search)
+        title_layout.addWidget(search_button)
         title_layout.addWidget(close_button)
-        
-        # 聊天历史显示区域
-        self.chat_history = QTextEdit()
-        self.chat_history.setReadOnly(True)
-        self.chat_history.setAcceptRichText(True)
-        self.chat_history.setFrameStyle(QFrame.Shape.NoFrame)
-        self.chat_history.setStyleSheet("""
-            QTextEdit {
-                background-color: rgba(255, 255, 255, 100);
-                border-radius: 10px;
-                padding: 10px;
+
+        # 搜索历史对话的输入框（默认隐藏）
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("搜索聊天记录，回车确认...")
+        self.search_input.returnPressed.connect(self.search_history)
+        self.search_input.setStyleSheet("""
+            QLineEdit {
+                border-radius: 12px;
+                padding: 5px 12px;
+                background: rgba(255, 255, 255, 150);
+                border: 1px solid rgba(200, 200, 200, 150);
                 font-family: 'Microsoft YaHei', Arial;
                 font-size: 12px;
             }
         """)
+        self.search_input.hide()
         
-        # 设置字体
-        font = QFont("Microsoft YaHei", 10)
-        self.chat_history.setFont(font)
+        # 聊天历史显示区域（只绘制可见的气泡，视图中最多保留chat_max_messages条）
+        self.chat_history = ChatHistoryView(get_config().get('chat_max_messages', 200))
         
         # 添加欢迎消息
         self.add_welcome_message()
@@ -170,6 +195,7 @@ class Chat(QDialog):
         
         # 构建完整布局
         frame_layout.addLayout(title_layout)
+        frame_layout.addWidget(self.search_input)
         frame_layout.addWidget(self.chat_history)
         frame_layout.addLayout(input_layout)
         
@@ -180,9 +206,86 @@ class Chat(QDialog):
         """设置AI管理器引用"""
         self.ai_manager = ai_manager
     
+    def warm_up_connection(self):
+        """在后台预热到AI接口的连接（连接最近用过时跳过）"""
+        if not self.ai_manager or self.warm_up_worker or not self.ai_manager.connection.needs_warm_up():
+            return
+        self.warm_up_worker = Worker(self.ai_manager.warm_up)
+        self.warm_up_worker.signals.finished.connect(self.on_warm_up_finished)
+        self.warm_up_worker.signals.error.connect(self.on_warm_up_finished)
+        start_worker(self.warm_up_worker)
+
+    def on_warm_up_finished(self, _):
+        self.warm_up_worker = None
+
     def set_pet_window(self, pet_window):
         """设置宠物窗口引用"""
         self.pet_window = pet_window
+
+    def set_store(self, store):
+        """设置对话记录存储"""
+        self.store = store
+
+    def restore_history(self, rows):
+        """把存储中最近的记录显示在欢迎消息之前 rows: [(id, role, content, created_at)]"""
+        messages = [(role, content) for _, role, content, _ in rows
+                    if role in ("user", "assistant") and content]
+        if rows:
+            self.oldest_history_id = rows[0][0]
+            # 继续向上滚动时从存储中按需加载更早的记录
+            self.chat_history.message_model.older_loader = self.load_older_history
+        self.chat_history.message_model.prepend_messages(messages)
+        self.chat_history.scrollToBottom()
+        print_debug(f"已恢复{len(messages)}条聊天记录")
+
+    def load_older_history(self, count):
+        """从存储中读取更早的记录"""
+        if not self.store or self.oldest_history_id is None:
+            return []
+        rows = self.store.recent(count, before_id=self.oldest_history_id)
+        if not rows:
+            return []
+        self.oldest_history_id = rows[0][0]
+        messages = [(role, content) for _, role, content, _ in rows
+                    if role in ("user", "assistant") and content]
+        # 这一批全是工具消息时显示一条占位，保证还能继续向上加载
+        return messages or [("system", "……")]
+
+    def toggle_search(self):
+        """显示或隐藏搜索框"""
+        if self.search_input.isVisible():
+            self.search_input.hide()
+            self.focus_input()
+        else:
+            self.search_input.show()
+            self.search_input.setFocus()
+
+    def search_history(self):
+        """在后台线程中全文检索聊天记录"""
+        query = self.search_input.text().strip()
+        if not query:
+            return
+        if not self.store:
+            self.add_message("system", "聊天记录未启用")
+            return
+        self.search_worker = Worker(self.store.search, query)
+        self.search_worker.signals.finished.connect(lambda rows: self.show_search_results(query, rows))
+        self.search_worker.signals.error.connect(lambda error: self.add_message("system", f"搜索失败: {error}"))
+        start_worker(self.search_worker)
+
+    def show_search_results(self, query, rows):
+        """以系统消息的形式显示搜索结果"""
+        self.search_worker = None
+        if not rows:
+            self.add_message("system", f"没有找到包含“{html.escape(query)}”的记录")
+            return
+        names = {"user": "我", "assistant": "小助手", "tool": "工具"}
+        lines = [f"找到{len(rows)}条包含“{html.escape(query)}”的记录："]
+        for _, role, content, created_at in rows:
+            when = time.strftime("%m-%d %H:%M", time.localtime(created_at))
+            text = content if len(content) <= 60 else content[:60] + "…"
+            lines.append(f"[{when}] {names.get(role, role)}：{html.escape(text)}")
+        self.add_message("system", "<br>".join(lines))
     
     def eventFilter(self, obj, event):
         """事件过滤器，处理回车键"""
@@ -198,65 +301,34 @@ class Chat(QDialog):
     
     def add_welcome_message(self):
         """添加欢迎消息"""
-        welcome_html = """
-            <div style='margin:12px 0;text-align:left;'>
-                <div style='display:inline-block;max-width:80%;'>
-                    <div style='font-size:9px;color:#888;margin-bottom:2px;'>小助手</div>
-                    <div style='background-color:#f0f0f0;border-radius:15px;padding:10px 14px;color:#333;'>
-                        你可以询问任何问题，或者让我帮你执行一些简单的操作。
-                    </div>
-                </div>
-            </div>
-        """
-        self.chat_history.setHtml(welcome_html)
-    
+        self.chat_history.add_message("assistant", "你可以询问任何问题，或者让我帮你执行一些简单的操作。")
+
     def add_message(self, role, content):
         """添加消息到聊天历史"""
-        if role == "user":
-            # 用户消息样式
-            html = f"""
-            <br>
-                <div style='margin:16px 0;text-align:right;'>
-                    <div style='display:inline-block;max-width:80%;'>
-                        <div style='font-size:9px;color:#888;margin-bottom:3px;'>我</div>
-                        <div style='background-color:#d9f4fe;border-radius:15px;padding:10px 14px;color:#333;box-shadow:0 1px 2px rgba(0,0,0,0.1);'>
-                            {content}
-                        </div>
-                    </div>
-                </div>
-            """
-        elif role == "assistant":
-            # AI助手消息样式
-            html = f"""
-            <br>
-                <div style='margin:16px 0;text-align:left;'>
-                    <div style='display:inline-block;max-width:80%;'>
-                        <div style='font-size:9px;color:#888;margin-bottom:3px;'>小助手</div>
-                        <div style='background-color:#f0f0f0;border-radius:15px;padding:10px 14px;color:#333;box-shadow:0 1px 2px rgba(0,0,0,0.1);'>
-                            {content}
-                        </div>
-                    </div>
-                </div>
-            """
-        else:
-            # 系统消息样式
-            html = f"""
-                <div style='margin:12px 0;text-align:center;'>
-                    <div style='display:inline-block;padding:5px 12px;background-color:rgba(240,240,240,0.7);border-radius:12px;'>
-                        <span style='color:#888888;font-style:italic;'>{content}</span>
-                    </div>
-                </div>
-            """
-        
-        # 添加HTML到聊天历史
-        cursor = self.chat_history.textCursor()
-        cursor.movePosition(cursor.MoveOperation.End)
-        self.chat_history.setTextCursor(cursor)
-        self.chat_history.insertHtml(html)
-        
-        # 滚动到底部
-        scrollbar = self.chat_history.verticalScrollBar()
-        scrollbar.setValue(scrollbar.maximum())
+        self.chat_history.add_message(role, content)
+
+    def begin_stream_message(self):
+        """开始一条流式AI回复"""
+        self.streaming = True
+        self.stream_text = ""
+        self.add_message("assistant", "")
+
+    def update_stream_message(self, delta, replace=False):
+        """向当前流式回复气泡追加内容（replace为True时先清空）"""
+        if not self.streaming:
+            self.begin_stream_message()
+        self.stream_text = delta if replace else self.stream_text + delta
+        self.chat_history.update_last_message(self.stream_text)
+
+    def end_stream_message(self, final_text):
+        """结束流式回复，以最终内容校正气泡"""
+        if not self.streaming:
+            self.add_message("assistant", final_text)
+            return
+        if final_text != self.stream_text:
+            self.update_stream_message(final_text, replace=True)
+        self.streaming = False
+        self.stream_text = ""
     
     def send_message(self):
         """发送用户消息"""
@@ -279,39 +351,75 @@ class Chat(QDialog):
         if self.pet_window:
             self.pet_window.handle_user_interaction()
 
-        # 异步处理AI响应，避免阻塞界面
-        QTimer.singleShot(10, lambda: self.process_ai_response(message))
+        # 在后台线程处理AI响应，避免阻塞界面
+        self.process_ai_response(message)
 
     def process_ai_response(self, message):
-        """异步处理AI响应"""
-        # 发送给AI处理
-        if self.ai_manager:
-            # 通知宠物窗口AI开始说话
+        """在后台线程中处理AI响应"""
+        if not self.ai_manager:
+            self.add_message("system", "AI管理器未初始化")
+            self.enable_input()
+            return
+
+        # 非流式模式下没有首个片段，直接通知宠物窗口AI开始说话
+        if self.pet_window and not self.ai_manager.stream:
+            self.pet_window.handle_ai_talking()
+
+        # AI请求和工具调用都在线程池中执行，结果经信号回到GUI线程
+        self.ai_worker = Worker(self.ai_manager.send_message, message, streaming=True)
+        self.ai_worker.signals.delta.connect(self.on_ai_delta)
+        self.ai_worker.signals.status.connect(self.set_status)
+        self.ai_worker.signals.finished.connect(self.on_ai_finished)
+        self.ai_worker.signals.error.connect(self.on_ai_error)
+        start_worker(self.ai_worker)
+
+    def set_status(self, text):
+        """在标题栏显示简短的接口状态，text为空时隐藏"""
+        self.status_label.setText(text)
+        self.status_label.setVisible(bool(text))
+
+    def on_ai_delta(self, delta, replace=False):
+        """收到AI流式回复片段"""
+        start = time.perf_counter()
+        if not self.streaming:
+            # 收到第一个片段时宠物开始说话
             if self.pet_window:
                 self.pet_window.handle_ai_talking()
+            self.begin_stream_message()
+        self.update_stream_message(delta, replace)
+        self.render_seconds += time.perf_counter() - start
 
-            try:
-                # 获取AI回复
-                ai_response = self.ai_manager.send_message(message)
+    def on_ai_finished(self, ai_response):
+        """AI回复完成"""
+        # 显示AI回复
+        start = time.perf_counter()
+        self.end_stream_message(ai_response)
+        self.render_seconds += time.perf_counter() - start
+        print_debug(f"收到AI回复: {ai_response}")
+        self.finish_ai_response()
 
-                # 显示AI回复
-                self.add_message("assistant", ai_response)
-                print_debug(f"收到AI回复: {ai_response}")
+    def on_ai_error(self, error):
+        """AI处理出错"""
+        self.streaming = False
+        error_msg = f"AI处理失败: {error}"
+        self.add_message("system", error_msg)
+        print_debug(error_msg)
+        self.finish_ai_response()
 
-            except Exception as e:
-                error_msg = f"AI处理失败: {str(e)}"
-                self.add_message("system", error_msg)
-                print_debug(error_msg)
+    def finish_ai_response(self):
+        """AI回复结束后的收尾工作"""
+        self.ai_worker = None
+        self.set_status(self.ai_manager.health_status() if self.ai_manager else "")
+        get_metrics().record_span("ui_render", self.render_seconds * 1000)
+        self.render_seconds = 0.0
 
-            # 通知宠物窗口AI说话结束
-            if self.pet_window:
-                self.pet_window.handle_ai_finished()
-        else:
-            self.add_message("system", "AI管理器未初始化")
+        # 通知宠物窗口AI说话结束
+        if self.pet_window:
+            self.pet_window.handle_ai_finished()
 
         # 重新启用输入控件
         self.enable_input()
-    
+
     def disable_input(self, placeholder=""):
         """禁用输入控件"""
         self.message_input.setEnabled(False)
@@ -0,0 +1,288 @@
+# 聊天记录视图模块
+# 基于模型/视图的消息列表：只绘制可见的气泡，缓存排版结果，限制视图中保留的消息数量
+
+import math
+from collections import OrderedDict
+from PyQt6.QtWidgets import QListView, QStyledItemDelegate, QAbstractItemView, QFrame
+from PyQt6.QtCore import Qt, QAbstractListModel, QModelIndex, QSize, QRectF, QTimer
+from PyQt6.QtGui import QColor, QFont, QPainter, QTextDocument
+
+# 取出完整消息字典的数据角色
+MessageRole = Qt.ItemDataRole.UserRole + 1
+
+# 不同角色的气泡样式
+BUBBLE_STYLES = {
+    "user": {"name": "我", "background": QColor("#d9f4fe"), "align": "right", "radius": 15},
+    "assistant": {"name": "小助手", "background": QColor("#f0f0f0"), "align": "left", "radius": 15},
+    "system": {"name": "", "background": QColor(240, 240, 240, 180), "align": "center", "radius": 12},
+}
+
+class MessageModel(QAbstractListModel):
+    """聊天消息模型
+
+    视图中最多保留max_messages条消息，更早的移入archived（不参与排版和绘制），
+    滚动到顶部时再按需加载回来；archived也用完时可通过older_loader从外部加载
+    """
+
+    def __init__(self, max_messages=200, max_archived=2000, parent=None):
+        super().__init__(parent)
+        self.max_messages = max_messages
+        self.max_archived = max_archived
+        self.messages = []
+        self.archived = []
+        self.next_id = 0
+        # 可选回调 older_loader(count) -> [(role, content), ...]，按时间顺序返回更早的消息
+        self.older_loader = None
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.messages)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        message = self.messages[index.row()]
+        if role == MessageRole:
+            return message
+        if role == Qt.ItemDataRole.DisplayRole:
+            return message["content"]
+        return None
+
+    def make_message(self, role, content):
+        """创建消息，version在内容变化时递增，用于让排版缓存失效"""
+        self.next_id += 1
+        return {"id": self.next_id, "role": role, "content": content, "version": 0}
+
+    def append_message(self, role, content):
+        """在末尾追加一条消息"""
+        message = self.make_message(role, content)
+        row = len(self.messages)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.messages.append(message)
+        self.endInsertRows()
+        self.trim()
+        return message
+
+    def update_last(self, content):
+        """更新最后一条消息的内容（流式回复）"""
+        if not self.messages:
+            return None
+        message = self.messages[-1]
+        message["content"] = content
+        message["version"] += 1
+        index = self.index(len(self.messages) - 1)
+        self.dataChanged.emit(index, index)
+        return index
+
+    def trim(self):
+        """超出上限时把最早的消息移出视图"""
+        overflow = len(self.messages) - self.max_messages
+        if overflow <= 0:
+            return
+        self.beginRemoveRows(QModelIndex(), 0, overflow - 1)
+        self.archived.extend(self.messages[:overflow])
+        del self.messages[:overflow]
+        self.endRemoveRows()
+        if len(self.archived) > self.max_archived:
+            del self.archived[:len(self.archived) - self.max_archived]
+
+    def prepend_messages(self, messages):
+        """在顶部插入一批更早的消息 messages: [(role, content), ...]"""
+        if not messages:
+            return 0
+        self.beginInsertRows(QModelIndex(), 0, len(messages) - 1)
+        self.messages[:0] = [self.make_message(role, content) for role, content in messages]
+        self.endInsertRows()
+        return len(messages)
+
+    def can_load_older(self):
+        """是否还有更早的消息可以加载"""
+        return bool(self.archived) or self.older_loader is not None
+
+    def load_older(self, count=20):
+        """把更早的count条消息加载回视图顶部，返回实际加载的数量"""
+        older = self.archived[-count:]
+        del self.archived[-count:]
+        if len(older) < count and self.older_loader:
+            loaded = self.older_loader(count - len(older)) or []
+            if not loaded:
+                # 外部也没有更早的消息了
+                self.older_loader = None
+            older = [self.make_message(role, content) for role, content in loaded] + older
+        if not older:
+            return 0
+
+        self.beginInsertRows(QModelIndex(), 0, len(older) - 1)
+        self.messages[:0] = older
+        self.endInsertRows()
+        return len(older)
+
+    def clear(self):
+        """清空所有消息"""
+        self.beginResetModel()
+        self.messages = []
+        self.archived = []
+        self.endResetModel()
+
+class MessageDelegate(QStyledItemDelegate):
+    """消息气泡绘制
+
+    每条消息排版一次后缓存尺寸和文档，重复绘制和滚动时不再重新排版
+    """
+
+    PADDING_X = 14
+    PADDING_Y = 10
+    MARGIN = 6
+    NAME_HEIGHT = 16
+
+    def __init__(self, parent=None, max_documents=64, max_sizes=4096):
+        super().__init__(parent)
+        self.font = QFont("Microsoft YaHei", 10)
+        self.name_font = QFont("Microsoft YaHei", 7)
+        self.max_documents = max_documents
+        self.max_sizes = max_sizes
+        # (消息id, version, 宽度) -> 排好版的QTextDocument / 行尺寸
+        self.documents = OrderedDict()
+        self.sizes = OrderedDict()
+
+    def view_width(self, option):
+        """列表可用宽度"""
+        view = self.parent()
+        if view is not None:
+            return view.viewport().width()
+        return option.rect.width()
+
+    def document(self, message, width):
+        """获取排好版的消息文档（LRU缓存）"""
+        key = (message["id"], message["version"], width)
+        document = self.documents.get(key)
+        if document is not None:
+            self.documents.move_to_end(key)
+            return document
+
+        document = QTextDocument()
+        document.setDefaultFont(self.font)
+        document.setDocumentMargin(0)
+        if message["role"] == "system":
+            document.setHtml(f"<span style='color:#888888;font-style:italic;'>{message['content']}</span>")
+        else:
+            document.setHtml(message["content"])
+
+        # 气泡最宽占80%，短消息收缩到内容宽度
+        text_width = max(40, int(width * 0.8) - 2 * self.PADDING_X)
+        document.setTextWidth(text_width)
+        ideal_width = math.ceil(document.idealWidth())
+        if ideal_width < text_width:
+            document.setTextWidth(ideal_width)
+
+        self.documents[key] = document
+        while len(self.documents) > self.max_documents:
+            self.documents.popitem(last=False)
+        return document
+
+    def sizeHint(self, option, index):
+        message = index.data(MessageRole)
+        width = self.view_width(option)
+        key = (message["id"], message["version"], width)
+        size = self.sizes.get(key)
+        if size is not None:
+            return size
+
+        document = self.document(message, width)
+        height = document.size().height() + 2 * self.PADDING_Y + 2 * self.MARGIN
+        if BUBBLE_STYLES.get(message["role"], BUBBLE_STYLES["system"])["name"]:
+            height += self.NAME_HEIGHT
+        size = QSize(width, math.ceil(height))
+        self.sizes[key] = size
+        while len(self.sizes) > self.max_sizes:
+            self.sizes.popitem(last=False)
+        return size
+
+    def paint(self, painter, option, index):
+        message = index.data(MessageRole)
+        style = BUBBLE_STYLES.get(message["role"], BUBBLE_STYLES["system"])
+        rect = option.rect
+        document = self.document(message, self.view_width(option))
+        bubble_width = document.size().width() + 2 * self.PADDING_X
+        bubble_height = document.size().height() + 2 * self.PADDING_Y
+
+        if style["align"] == "right":
+            x = rect.right() - 4 - bubble_width
+        elif style["align"] == "center":
+            x = rect.left() + (rect.width() - bubble_width) / 2
+        else:
+            x = rect.left() + 4
+        y = rect.top() + self.MARGIN
+
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+
+        # 发送者名称
+        if style["name"]:
+            painter.setFont(self.name_font)
+            painter.setPen(QColor("#888888"))
+            name_rect = QRectF(x, y, bubble_width, self.NAME_HEIGHT)
+            align = Qt.AlignmentFlag.AlignRight if style["align"] == "right" else Qt.AlignmentFlag.AlignLeft
+            painter.drawText(name_rect, align | Qt.AlignmentFlag.AlignVCenter, style["name"])
+            y += self.NAME_HEIGHT
+
+        # 气泡背景和内容
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(style["background"])
+        painter.drawRoundedRect(QRectF(x, y, bubble_width, bubble_height), style["radius"], style["radius"])
+        painter.translate(x + self.PADDING_X, y + self.PADDING_Y)
+        document.drawContents(painter)
+        painter.restore()
+
+class ChatHistoryView(QListView):
+    """聊天记录列表"""
+
+    def __init__(self, max_messages=200, parent=None):
+        super().__init__(parent)
+        self.message_model = MessageModel(max_messages, parent=self)
+        self.message_delegate = MessageDelegate(self)
+        self.setModel(self.message_model)
+        self.setItemDelegate(self.message_delegate)
+
+        self.setFrameStyle(QFrame.Shape.NoFrame)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        self.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        self.setStyleSheet("""
+            QListView {
+                background-color: rgba(255, 255, 255, 100);
+                border-radius: 10px;
+                padding: 4px;
+            }
+        """)
+
+        # 滚动到顶部时加载更早的消息
+        self.verticalScrollBar().valueChanged.connect(self.on_scrolled)
+
+    def add_message(self, role, content):
+        """追加一条消息并滚动到底部"""
+        self.message_model.append_message(role, content)
+        self.scrollToBottom()
+
+    def update_last_message(self, content):
+        """更新最后一条消息（流式回复），高度变化时重新排版"""
+        index = self.message_model.update_last(content)
+        if index is not None:
+            self.message_delegate.sizeHintChanged.emit(index)
+            self.scrollToBottom()
+
+    def clear_messages(self):
+        """清空聊天记录"""
+        self.message_model.clear()
+
+    def on_scrolled(self, value):
+        """滚动到顶部时加载更早的消息，并保持当前看到的位置不变"""
+        if value != self.verticalScrollBar().minimum() or not self.message_model.can_load_older():
+            return
+        scrollbar = self.verticalScrollBar()
+        distance_from_bottom = scrollbar.maximum() - value
+        if self.message_model.load_older():
+            self.doItemsLayout()
+            QTimer.singleShot(0, lambda: scrollbar.setValue(scrollbar.maximum() - distance_from_bottom))
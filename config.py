@@ -0,0 +1,213 @@
+# 配置模块
+# 全程序共享一份config.json解析结果，提供校验、类型化访问和热重载
+
+import json
+import os
+import threading
+
+CONFIG_PATH = 'config.json'
+
+# 顶层配置项的类型和默认值
+SCHEMA = {
+    'debug': (bool, False),
+    'api_key': (str, ''),
+    'api_base': (str, 'https://api.openai.com/v1'),
+    'model': (str, 'gpt-3.5-turbo'),
+    'backends': (list, []),
+    'router': (dict, {}),
+    'resilience': (dict, {}),
+    'stream': (bool, True),
+    'system_prompt': (str, ''),
+    'native_tools': (bool, True),
+    'json_tool_prompt': (str, ''),
+    'context_token_budget': (int, 4000),
+    'context_summary': (bool, False),
+    'response_cache': (dict, {}),
+    'history': (dict, {}),
+    'metrics': (dict, {}),
+    'recording': (dict, {}),
+    'http': (dict, {}),
+    'tool_timeout_seconds': ((int, float), 30),
+    'max_tool_workers': (int, 4),
+    'functions': (list, []),
+    'plugin_dirs': (list, ['plugins']),
+    'tool_pool': (dict, {}),
+    'weather': (dict, {}),
+    'screenshot': (dict, {}),
+    'pet_states': (dict, {}),
+    'animation_cache_mb': ((int, float), 32),
+    'power': (dict, {}),
+    'sprite_mask': (bool, False),
+    'chat_max_messages': (int, 200),
+    'idle_timeout_seconds': ((int, float), 60),
+    'startup_budget_ms': ((int, float), 1500),
+}
+
+class ConfigError(Exception):
+    """配置文件无法读取或不符合格式"""
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def validate_cache_policy(policy, prefix):
+    """校验一个工具的缓存策略（ToolCache使用的字段），返回错误信息列表"""
+    if not isinstance(policy, dict):
+        return [f"{prefix} 必须是\"none\"或缓存策略对象"]
+    errors = []
+    ttl = policy.get('ttl_seconds', 0)
+    if ttl != 'none' and not is_number(ttl):
+        errors.append(f"{prefix}.ttl_seconds 必须是秒数或\"none\"")
+    key = policy.get('key')
+    if key is not None and not (isinstance(key, list) and all(isinstance(name, str) for name in key)):
+        errors.append(f"{prefix}.key 必须是参数名列表")
+    max_entries = policy.get('max_entries', 32)
+    if not isinstance(max_entries, int) or isinstance(max_entries, bool) or max_entries <= 0:
+        errors.append(f"{prefix}.max_entries 必须是正整数")
+    return errors
+
+def validate_config(data):
+    """按SCHEMA校验配置，返回错误信息列表"""
+    if not isinstance(data, dict):
+        return ["配置文件顶层必须是JSON对象"]
+
+    errors = []
+    for key, (expected_type, _) in SCHEMA.items():
+        if key not in data:
+            continue
+        value = data[key]
+        # bool是int的子类，数值项不接受true/false
+        if not isinstance(value, expected_type) or (
+                isinstance(value, bool) and expected_type is not bool):
+            errors.append(f"配置项 {key} 类型错误: {value!r}")
+
+    for index, func in enumerate(data.get('functions', []) if isinstance(data.get('functions'), list) else []):
+        if not isinstance(func, dict):
+            errors.append(f"functions[{index}] 必须是对象")
+            continue
+        # 工具描述由插件生成，这里的条目只覆盖其中的部分字段
+        if not isinstance(func.get('name'), str):
+            errors.append(f"functions[{index}].name 缺失或类型错误")
+        for key, expected_type in (('description', str), ('parameters', dict)):
+            if key in func and not isinstance(func[key], expected_type):
+                errors.append(f"functions[{index}].{key} 类型错误")
+        if 'cache' in func and func['cache'] != 'none':
+            errors.extend(validate_cache_policy(func['cache'], f"functions[{index}].cache"))
+
+    for index, backend in enumerate(data.get('backends', []) if isinstance(data.get('backends'), list) else []):
+        if not isinstance(backend, dict) or not isinstance(backend.get('api_base'), str):
+            errors.append(f"backends[{index}] 必须是包含api_base的对象")
+
+    for state_name, path in (data.get('pet_states') or {}).items() if isinstance(data.get('pet_states'), dict) else []:
+        if not isinstance(path, str):
+            errors.append(f"pet_states.{state_name} 必须是文件路径")
+    return errors
+
+class Config:
+    """共享配置
+
+    只在启动和文件变化时解析config.json；reload()成功后依次通知订阅者
+    """
+
+    def __init__(self, path=CONFIG_PATH):
+        self.path = path
+        self.data = {}
+        self.error = None
+        self.mtime = None
+        self.listeners = []
+        self.lock = threading.Lock()
+
+        try:
+            self.data = self.read()
+        except ConfigError as e:
+            self.error = str(e)
+
+    def read(self):
+        """读取并校验配置文件"""
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            raise ConfigError(f"加载配置文件失败: {str(e)}")
+
+        errors = validate_config(data)
+        if errors:
+            raise ConfigError("配置文件校验失败: " + "；".join(errors))
+        self.mtime = mtime
+        return data
+
+    def reload(self):
+        """文件有变化时重新加载，返回是否应用了新配置
+
+        新配置无效时保留旧配置
+        """
+        try:
+            if self.mtime is not None and os.path.getmtime(self.path) == self.mtime:
+                return False
+            data = self.read()
+        except (OSError, ConfigError) as e:
+            print(f"配置重新加载失败，继续使用原配置: {str(e)}")
+            return False
+
+        with self.lock:
+            self.data = data
+            self.error = None
+        for listener in list(self.listeners):
+            try:
+                listener(self)
+            except Exception as e:
+                print(f"应用新配置失败: {str(e)}")
+        return True
+
+    def subscribe(self, listener):
+        """注册配置变化回调，回调参数为Config对象"""
+        self.listeners.append(listener)
+
+    def get(self, key, default=None):
+        """读取顶层配置项，缺失时依次使用default和SCHEMA中的默认值"""
+        if key in self.data:
+            return self.data[key]
+        if default is not None:
+            return default
+        return SCHEMA[key][1] if key in SCHEMA else None
+
+    def section(self, name):
+        """读取一个配置分组（字典）"""
+        value = self.data.get(name)
+        return value if isinstance(value, dict) else {}
+
+    @property
+    def debug(self):
+        return bool(self.get('debug'))
+
+    @property
+    def model(self):
+        return self.get('model')
+
+    @property
+    def system_prompt(self):
+        return self.get('system_prompt')
+
+    @property
+    def functions(self):
+        return self.get('functions')
+
+    @property
+    def pet_states(self):
+        return self.get('pet_states')
+
+    @property
+    def idle_timeout_seconds(self):
+        return self.get('idle_timeout_seconds')
+
+_config = None
+_config_lock = threading.Lock()
+
+def get_config():
+    """获取共享的配置对象（首次调用时解析config.json）"""
+    global _config
+    if _config is None:
+        with _config_lock:
+            if _config is None:
+                _config = Config()
+    return _config
@@ -0,0 +1,166 @@
+# 连接管理模块
+# 为OpenAI客户端提供调优过的httpx连接池：长连接保活、连接数和超时可配置、可选HTTP/2，
+# 支持提前预热连接，并报告每次请求是否复用了已有连接
+
+import socket
+import threading
+import time
+
+from config import get_config
+from metrics import get_metrics
+
+def print_debug(message):
+    """打印调试信息"""
+    if get_config().debug:
+        print(f"[CONNECTION DEBUG] {message}")
+
+class ConnectionManager:
+    """httpx连接池管理
+
+    http_config为config.json中的http分组；httpx随openai一起安装，首次使用时才导入
+    """
+
+    def __init__(self, http_config=None):
+        self.http_config = dict(http_config or {})
+        self._client = None
+        self.lock = threading.Lock()
+        self.warm_up_lock = threading.Lock()
+        # 最近一次请求（含预热）完成的时间，用来判断连接是否可能已被服务器关闭
+        self.last_used = 0.0
+        # 每次请求是否复用连接的回调 on_connection(reused)
+        self.on_connection = None
+
+    @property
+    def client(self):
+        """共享的httpx.Client"""
+        if self._client is None:
+            with self.lock:
+                if self._client is None:
+                    self._client = self.create_client()
+        return self._client
+
+    def create_client(self, event_hooks=None):
+        """按http配置创建httpx.Client，event_hooks默认为记录连接复用的回调"""
+        import httpx
+
+        config = self.http_config
+        http2 = config.get('http2', False)
+        if http2:
+            try:
+                import h2  # noqa: F401  httpx的HTTP/2支持需要h2
+            except ImportError:
+                print_debug("未安装h2，HTTP/2不可用，使用HTTP/1.1")
+                http2 = False
+
+        client = httpx.Client(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=config.get('max_connections', 8),
+                max_keepalive_connections=config.get('max_keepalive_connections', 4),
+                # httpx默认空闲5秒就关闭连接，这里保持得更久，宠物闲置后首条消息也能复用
+                keepalive_expiry=config.get('keepalive_expiry_seconds', 120)
+            ),
+            timeout=httpx.Timeout(
+                connect=config.get('connect_timeout_seconds', 5),
+                read=config.get('read_timeout_seconds', 60),
+                write=config.get('write_timeout_seconds', 10),
+                pool=config.get('pool_timeout_seconds', 5)
+            ),
+            event_hooks=event_hooks or {"request": [self.on_request], "response": [self.on_response]}
+        )
+        print_debug(f"HTTP连接池已创建（HTTP/2: {http2}）")
+        return client
+
+    def create_cancellable_client(self):
+        """创建独立连接的httpx.Client，返回(client, cancel)
+
+        cancel()可以在其他线程中调用：先shutdown该客户端建立的所有socket，
+        阻塞在等待响应上的请求会立即出错（单纯close无法唤醒Linux上阻塞的读取），再关闭客户端
+        """
+        sockets = []
+
+        def on_request(request):
+            def trace(event_name, info):
+                # TLS握手后的socket是新的对象，两个都记下
+                if event_name in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+                    sock = info["return_value"].get_extra_info("socket")
+                    if sock is not None:
+                        sockets.append(sock)
+
+            request.extensions["trace"] = trace
+
+        client = self.create_client(event_hooks={"request": [on_request]})
+
+        def cancel():
+            for sock in list(sockets):
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            client.close()
+
+        return client, cancel
+
+    def on_request(self, request):
+        """请求发出前挂上trace回调，建立新连接时会收到connect_tcp事件"""
+        state = {"new_connection": False}
+
+        def trace(event_name, info):
+            if event_name.startswith("connection.connect_tcp"):
+                state["new_connection"] = True
+
+        request.extensions["trace"] = trace
+        request.extensions["connection_state"] = state
+
+    def on_response(self, response):
+        """收到响应头时记录本次请求是否复用了连接"""
+        self.last_used = time.monotonic()
+        state = response.request.extensions.get("connection_state")
+        if state is None or response.request.extensions.get("warm_up"):
+            return
+        reused = not state["new_connection"]
+        print_debug(f"{response.request.method} {response.request.url.path}: "
+                    f"{'复用已有连接' if reused else '新建连接'}")
+        if self.on_connection:
+            self.on_connection(reused)
+
+    def needs_warm_up(self):
+        """距上次请求超过预热间隔时，连接可能已经断开"""
+        interval = self.http_config.get('warm_up_interval_seconds', 30)
+        return time.monotonic() - self.last_used > interval
+
+    def warm_up(self, base_urls, force=False):
+        """向每个接口地址发一个HEAD请求，提前完成DNS、TCP和TLS握手
+
+        返回是否发出了预热请求；已有预热在进行或连接最近刚用过时直接返回
+        """
+        if not self.http_config.get('warm_up', True):
+            return False
+        if not force and not self.needs_warm_up():
+            return False
+        if not self.warm_up_lock.acquire(blocking=False):
+            return False
+        try:
+            warmed = False
+            for base_url in base_urls:
+                start = time.perf_counter()
+                try:
+                    # 任何状态码都说明连接已建立，响应结束后连接回到池中
+                    self.client.head(base_url, extensions={"warm_up": True})
+                except Exception as e:
+                    print_debug(f"连接预热失败: {base_url}: {str(e)}")
+                    continue
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                get_metrics().observe("warm_up", elapsed_ms)
+                print_debug(f"连接预热完成: {base_url}（{elapsed_ms:.0f}ms）")
+                warmed = True
+            return warmed
+        finally:
+            self.warm_up_lock.release()
+
+    def close(self):
+        """关闭连接池"""
+        with self.lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
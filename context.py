@@ -0,0 +1,144 @@
+# 对话上下文模块
+# 在token预算内保留尽可能多的最近消息，系统提示词始终保留
+
+# 每条消息的固定开销（角色、分隔符等）
+MESSAGE_OVERHEAD_TOKENS = 4
+# 图片按固定开销估算，避免把base64内容当作文本计数
+IMAGE_TOKENS = 765
+
+_encoding = None
+
+def count_tokens(text):
+    """估算文本的token数，安装了tiktoken时使用精确计数"""
+    global _encoding
+    if not text:
+        return 0
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text))
+
+    # 粗略估算：中日韩字符约1个token，其余字符约4个一个token
+    cjk = sum(1 for ch in text if '\u2e80' <= ch <= '\u9fff' or '\uac00' <= ch <= '\ud7af')
+    return cjk + (len(text) - cjk + 3) // 4
+
+def count_message_tokens(message):
+    """估算单条消息的token数"""
+    tokens = MESSAGE_OVERHEAD_TOKENS
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        for part in content:
+            if part.get("type") == "image_url":
+                tokens += IMAGE_TOKENS
+            else:
+                tokens += count_tokens(part.get("text", ""))
+    else:
+        tokens += count_tokens(content)
+    for tool_call in message.get("tool_calls") or []:
+        function = tool_call.get("function", {})
+        tokens += count_tokens(function.get("name", "")) + count_tokens(function.get("arguments", ""))
+    return tokens
+
+class ContextWindow:
+    """按token预算滑动的对话上下文
+
+    消息按轮次淘汰（一轮从用户消息开始，包含其后的工具调用和回复），
+    当前轮次永远保留；可选地把被淘汰的轮次交给summarizer压缩成滚动摘要
+    """
+
+    def __init__(self, system_prompt="", token_budget=4000, summarizer=None):
+        self.system_prompt = system_prompt
+        self.token_budget = token_budget
+        self.summarizer = summarizer
+
+        # 消息及其缓存的token数、是否为一轮的开始，三个列表一一对应
+        self.messages = []
+        self.token_counts = []
+        self.turn_starts = []
+        self.total_tokens = 0
+
+        self.summary = ""
+        self.system_tokens = 0
+        self.set_system_prompt(system_prompt)
+
+        # 可选回调 on_append(message)，每追加一条消息调用一次（用于持久化）
+        self.on_append = None
+
+    def set_system_prompt(self, system_prompt):
+        """设置系统提示词"""
+        self.system_prompt = system_prompt
+        self.system_tokens = count_tokens(system_prompt) + MESSAGE_OVERHEAD_TOKENS if system_prompt else 0
+
+    def append(self, message, new_turn=False, notify=True):
+        """追加一条消息，new_turn表示这是新一轮对话的用户消息
+
+        notify为False时不触发on_append（例如从记录中恢复的消息）
+        """
+        tokens = count_message_tokens(message)
+        self.messages.append(message)
+        self.token_counts.append(tokens)
+        self.turn_starts.append(new_turn)
+        self.total_tokens += tokens
+        if notify and self.on_append:
+            self.on_append(message)
+
+    def extend(self, messages):
+        """追加多条同一轮内的消息"""
+        for message in messages:
+            self.append(message)
+
+    def system_messages(self):
+        """系统提示词及滚动摘要"""
+        messages = []
+        if self.system_prompt:
+            messages.append({"role": "system", "content": self.system_prompt})
+        if self.summary:
+            messages.append({"role": "system", "content": f"此前对话的摘要：{self.summary}"})
+        return messages
+
+    def used_tokens(self):
+        """当前上下文占用的token数"""
+        summary_tokens = count_tokens(self.summary) + MESSAGE_OVERHEAD_TOKENS if self.summary else 0
+        return self.system_tokens + summary_tokens + self.total_tokens
+
+    def trim(self):
+        """淘汰最早的轮次直到满足token预算，返回被淘汰的消息"""
+        evicted = []
+        while self.used_tokens() > self.token_budget:
+            # 找到第二个轮次开始的位置，之前的部分整体淘汰
+            end = next((i for i in range(1, len(self.messages)) if self.turn_starts[i]), None)
+            if end is None:
+                break
+            evicted.extend(self.messages[:end])
+            self.total_tokens -= sum(self.token_counts[:end])
+            del self.messages[:end]
+            del self.token_counts[:end]
+            del self.turn_starts[:end]
+
+        if evicted and self.summarizer:
+            self.summary = self.summarizer(self.summary, evicted) or self.summary
+        return evicted
+
+    def current_turn(self, previous_turns=0):
+        """当前轮次的消息，previous_turns指定额外包含之前的轮次数"""
+        starts = [i for i, turn_start in enumerate(self.turn_starts) if turn_start]
+        if not starts:
+            return list(self.messages)
+        return self.messages[starts[max(0, len(starts) - 1 - previous_turns)]:]
+
+    def build(self):
+        """生成发送给API的消息列表"""
+        self.trim()
+        return self.system_messages() + self.messages
+
+    def clear(self):
+        """清空对话（保留系统提示词）"""
+        self.messages = []
+        self.token_counts = []
+        self.turn_starts = []
+        self.total_tokens = 0
+        self.summary = ""
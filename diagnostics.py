@@ -0,0 +1,90 @@
+# 诊断面板模块
+# 从托盘菜单打开，显示各阶段耗时分位数、计数器和最近几轮的阶段明细
+
+import time
+from PyQt6.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QPlainTextEdit, QPushButton, QFileDialog
+from PyQt6.QtCore import QTimer
+from PyQt6.QtGui import QFont
+
+from metrics import get_metrics
+
+def format_snapshot(snapshot, recent_turns=10):
+    """把指标快照格式化为纯文本"""
+    lines = ["阶段耗时（最近轮次，毫秒）:"]
+    lines.append(f"  {'阶段':<20}{'次数':>6}{'平均':>10}{'p50':>10}{'p95':>10}{'最大':>10}")
+    for name, stats in sorted(snapshot["spans"].items()):
+        lines.append(f"  {name:<20}{stats['count']:>6}{stats['mean_ms']:>10.1f}"
+                     f"{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['max_ms']:>10.1f}")
+
+    lines.append("")
+    lines.append("计数器（启动以来）:")
+    for name, value in sorted(snapshot["counters"].items()):
+        lines.append(f"  {name}: {value}")
+
+    tool_cache = snapshot.get("stats", {}).get("tool_cache")
+    if tool_cache:
+        lines.append("")
+        lines.append("工具结果缓存:")
+        lines.append(f"  {'工具':<20}{'命中':>6}{'未命中':>8}{'合并':>6}{'淘汰':>6}{'条目':>6}{'命中率':>8}")
+        for name, stats in sorted(tool_cache.items()):
+            lines.append(f"  {name:<20}{stats['hits']:>6}{stats['misses']:>8}{stats['shared']:>6}"
+                         f"{stats['evictions']:>6}{stats['entries']:>6}{stats['hit_rate']:>8.0%}")
+
+    lines.append("")
+    lines.append("最近轮次:")
+    for turn in reversed(snapshot["turns"][-recent_turns:]):
+        when = time.strftime("%H:%M:%S", time.localtime(turn["started_at"]))
+        total = f"{turn['duration_ms']:.0f}ms" if turn["duration_ms"] is not None else "进行中"
+        spans = "，".join(f"{span['name']} {span['ms']:.0f}" for span in turn["spans"])
+        lines.append(f"  #{turn['id']} [{when}] {total}：{spans}")
+    return "\n".join(lines)
+
+class DiagnosticsPanel(QDialog):
+    """诊断面板，显示期间每秒刷新一次"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("诊断信息")
+        self.resize(640, 480)
+
+        self.text = QPlainTextEdit()
+        self.text.setReadOnly(True)
+        self.text.setFont(QFont("Consolas", 9))
+
+        refresh_button = QPushButton("刷新")
+        refresh_button.clicked.connect(self.refresh)
+        export_button = QPushButton("导出...")
+        export_button.clicked.connect(self.export)
+
+        buttons = QHBoxLayout()
+        buttons.addStretch()
+        buttons.addWidget(refresh_button)
+        buttons.addWidget(export_button)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.text)
+        layout.addLayout(buttons)
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(1000)
+        self.timer.timeout.connect(self.refresh)
+
+    def refresh(self):
+        """刷新显示的指标"""
+        self.text.setPlainText(format_snapshot(get_metrics().snapshot()))
+
+    def export(self):
+        """导出为Prometheus文本（.prom）或JSON（.json）文件"""
+        path, _ = QFileDialog.getSaveFileName(self, "导出指标", "metrics.prom",
+                                              "Prometheus文本 (*.prom *.txt);;JSON (*.json)")
+        if path:
+            get_metrics().dump(path)
+
+    def showEvent(self, event):
+        self.refresh()
+        self.timer.start()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.timer.stop()
+        super().hideEvent(event)
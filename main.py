@@ -1,74 +1,64 @@
 # 桌面宠物主程序
 
+import time
+STARTED_AT = time.perf_counter()  # 尽早记录，启动追踪包含模块导入耗时
+
+import multiprocessing
+# 打包后的程序中，工具进程池的工作进程也从这里启动，必须在导入界面模块之前进入工作进程
+multiprocessing.freeze_support()
+
 import sys
-import json
 import os
-from pathlib import Path
 from PyQt6.QtWidgets import QApplication, QSystemTrayIcon, QMenu
-from PyQt6.QtGui import QIcon, QAction
+from PyQt6.QtCore import QFileSystemWatcher, QTimer
+from PyQt6.QtGui import QIcon, QAction, QPixmap
 
 # 导入桌宠的模块
 from pet import Pet
 from chat import Chat
 from ai import AI
-
-# 从config.json读取debug配置
-def load_debug_config():
-    try:
-        with open('config.json', 'r', encoding='utf-8') as f:
-            config = json.load(f)
-            return config.get('debug', False)
-    except Exception:
-        return False
-
-DEBUG = load_debug_config()
+from bundle import get_asset_store
+from config import get_config
+from metrics import get_metrics, start_http_server
+from startup import StartupTrace
+from store import ConversationStore
+from worker import Worker, start_worker
 
 def print_debug(message):
     """打印调试信息"""
-    if DEBUG:
+    if get_config().debug:
         print(f"[MAIN DEBUG] {message}")
 
-def get_resource_path(relative_path):
-    """获取资源文件的正确路径，兼容开发环境和打包后的环境"""
-    if hasattr(sys, '_MEIPASS'):
-        # 打包后的环境
-        base_path = Path(sys._MEIPASS)
-    else:
-        # 开发环境
-        base_path = Path(__file__).parent
-
-    # 尝试不同的路径
-    paths_to_try = [
-        base_path / relative_path,  # 打包后的路径
-        base_path / '..' / relative_path,  # 开发环境路径
-        Path(relative_path)  # 相对路径
-    ]
+def load_config():
+    """加载配置文件（全程序共享同一份解析结果）"""
+    config = get_config()
+    if config.error:
+        print(config.error)
+        print("请确保config.json文件存在且格式正确")
+        sys.exit(1)
+    print_debug("配置文件加载成功")
+    return config
 
-    for path in paths_to_try:
-        if path.exists():
-            return str(path)
+def watch_config(config, app):
+    """监视config.json，文件变化时热重载配置"""
+    watcher = QFileSystemWatcher([config.path], app)
 
-    # 如果都找不到，返回原始路径
-    return relative_path
+    def on_config_changed(path):
+        # 部分编辑器保存时会替换文件，需要重新加入监视
+        if path not in watcher.files() and os.path.exists(path):
+            watcher.addPath(path)
+        if config.reload():
+            print_debug("配置文件已重新加载")
 
-def load_config(config_path='config.json'):
-    """加载配置文件"""
-    try:
-        with open(config_path, 'r', encoding='utf-8') as f:
-            config = json.load(f)
-            print_debug("配置文件加载成功")
-            return config
-    except Exception as e:
-        print(f"加载配置文件失败: {str(e)}")
-        print("请确保config.json文件存在且格式正确")
-        sys.exit(1)
+    watcher.fileChanged.connect(on_config_changed)
+    return watcher
 
 def check_assets():
-    """检查资源文件是否存在"""
-    assets_dir = get_resource_path('assets')
-    if not os.path.exists(assets_dir):
-        print("错误：assets目录不存在")
-        print("请确保assets目录存在并包含宠物图片文件")
+    """检查资源文件是否存在（资源包和assets目录中的散文件都算）"""
+    store = get_asset_store()
+    if not store.available():
+        print("错误：assets目录和资源包都不存在")
+        print("请确保assets目录存在并包含宠物图片文件，或运行 python bundle.py 生成资源包")
         sys.exit(1)
 
     # 检查必要的图片文件
@@ -82,8 +72,7 @@ def check_assets():
 
     missing_files = []
     for file in required_files:
-        file_path = os.path.join(assets_dir, file)
-        if not os.path.exists(file_path):
+        if not store.exists(f"assets/{file}"):
             missing_files.append(file)
 
     if missing_files:
@@ -97,14 +86,14 @@ def check_assets():
 
 def create_tray_icon(app):
     """创建系统托盘图标"""
-    icon_path = get_resource_path('assets/tray_icon.png')
-
-    if not os.path.exists(icon_path):
+    pixmap = QPixmap()
+    data = get_asset_store().read('assets/tray_icon.png')
+    if data is None or not pixmap.loadFromData(data):
         print("错误：找不到托盘图标文件")
         sys.exit(1)
 
     # 创建托盘图标
-    tray_icon = QSystemTrayIcon(QIcon(icon_path), app)
+    tray_icon = QSystemTrayIcon(QIcon(pixmap), app)
 
     print_debug("系统托盘图标创建成功")
     return tray_icon
@@ -128,7 +117,11 @@ def create_tray_menu(pet_window, chat_window, app):
     chat_action.triggered.connect(lambda: pet_window.toggle_chat())
     menu.addAction(chat_action)
 
-
+    # 诊断面板：各阶段耗时和计数器
+    if get_config().section('metrics').get('show_panel', True):
+        diagnostics_action = QAction("诊断信息", menu)
+        diagnostics_action.triggered.connect(lambda: show_diagnostics(menu))
+        menu.addAction(diagnostics_action)
 
     # 分隔线
     menu.addSeparator()
@@ -141,8 +134,48 @@ def create_tray_menu(pet_window, chat_window, app):
     print_debug("托盘菜单创建成功")
     return menu
 
+def show_diagnostics(menu):
+    """打开诊断面板（首次打开时创建）"""
+    panel = getattr(menu, "diagnostics_panel", None)
+    if panel is None:
+        from diagnostics import DiagnosticsPanel
+        panel = menu.diagnostics_panel = DiagnosticsPanel()
+    panel.show()
+    panel.raise_()
+
+def setup_metrics_export(config, app):
+    """按配置启动本地指标接口，并在退出时把指标写入文件"""
+    metrics_config = config.section('metrics')
+    server = None
+    port = metrics_config.get('http_port', 0)
+    if port:
+        try:
+            server = start_http_server(port)
+            print_debug(f"指标接口已启动: http://127.0.0.1:{port}/metrics")
+        except OSError as e:
+            print(f"指标接口启动失败: {str(e)}")
+
+    dump_path = metrics_config.get('dump_path', '')
+    if dump_path:
+        def dump_metrics():
+            try:
+                get_metrics().dump(dump_path)
+            except OSError as e:
+                print(f"指标导出失败: {str(e)}")
+        app.aboutToQuit.connect(dump_metrics)
+    return server
+
 def main():
-    """主函数"""
+    """主函数
+
+    先显示宠物窗口，聊天窗口、AI和托盘在进入事件循环后再创建，
+    openai客户端在后台线程中预加载
+
+    使用 --startup-check 参数启动时，宠物窗口出现后输出启动耗时并退出，
+    超出startup_budget_ms时退出码为1
+    """
+    startup_trace = StartupTrace(STARTED_AT)
+    startup_trace.mark("导入模块")
     print_debug("程序启动")
     
     # 创建QApplication
@@ -152,40 +185,104 @@ def main():
     check_assets()
     # 加载配置
     config = load_config()
-    # 创建AI管理器
-    print_debug("初始化AI管理器...")
-    ai_manager = AI(config)
+    startup_trace.mark("初始化应用和配置")
     # 创建宠物窗口
     print_debug("初始化宠物窗口...")
     pet_window = Pet(config)
-    # 创建聊天窗口
-    print_debug("初始化聊天窗口...")
-    chat_window = Chat()
-    # 设置相互引用
-    pet_window.set_chat_window(chat_window)
-    chat_window.set_ai_manager(ai_manager)
-    chat_window.set_pet_window(pet_window)
-    
-    print_debug("组件关联设置完成")
-    
-    # 创建系统托盘
-    tray_icon = create_tray_icon(app)
-    tray_menu = create_tray_menu(pet_window, chat_window, app)
-    tray_icon.setContextMenu(tray_menu)
-    
-    # 托盘图标双击事件
-    def on_tray_activated(reason):
-        if reason == QSystemTrayIcon.ActivationReason.DoubleClick:
-            pet_window.show()
-            print_debug("双击托盘图标，显示宠物")
-    
-    tray_icon.activated.connect(on_tray_activated)
-    
-    # 显示托盘图标
-    tray_icon.show()
-    
     # 显示宠物窗口
     pet_window.show()
+    startup_trace.mark("创建宠物窗口")
+
+    # 事件循环中创建的组件需要保持引用
+    components = {}
+    check_mode = "--startup-check" in sys.argv
+
+    def finish_startup():
+        """宠物窗口出现后完成其余初始化"""
+        startup_trace.mark("宠物窗口可见")
+        budget_ms = config.get('startup_budget_ms', 1500)
+        visible_ms = startup_trace.elapsed_ms("宠物窗口可见")
+        if visible_ms > budget_ms:
+            print(f"警告：宠物窗口出现耗时 {visible_ms:.0f}ms，超出预算 {budget_ms}ms")
+
+        # 创建AI管理器
+        print_debug("初始化AI管理器...")
+        ai_manager = AI(config)
+        # 创建聊天窗口
+        print_debug("初始化聊天窗口...")
+        chat_window = Chat()
+        # 设置相互引用
+        pet_window.set_chat_window(chat_window)
+        chat_window.set_ai_manager(ai_manager)
+        chat_window.set_pet_window(pet_window)
+
+        app.aboutToQuit.connect(ai_manager.close_tool_pool)
+
+        # 配置文件变化时把新配置应用到各组件
+        config.subscribe(ai_manager.apply_config)
+        config.subscribe(pet_window.apply_config)
+        components["config_watcher"] = watch_config(config, app)
+        
+        print_debug("组件关联设置完成")
+        
+        # 创建系统托盘
+        tray_icon = create_tray_icon(app)
+        tray_menu = create_tray_menu(pet_window, chat_window, app)
+        tray_icon.setContextMenu(tray_menu)
+        
+        # 托盘图标双击事件
+        def on_tray_activated(reason):
+            if reason == QSystemTrayIcon.ActivationReason.DoubleClick:
+                pet_window.show()
+                print_debug("双击托盘图标，显示宠物")
+        
+        tray_icon.activated.connect(on_tray_activated)
+        
+        # 显示托盘图标
+        tray_icon.show()
+        components.update(ai_manager=ai_manager, chat_window=chat_window,
+                          tray_icon=tray_icon, tray_menu=tray_menu)
+
+        if check_mode:
+            # 启动检查只测量到这里，不读写对话记录、不预加载和预热连接（避免网络请求和残留文件）
+            startup_trace.mark("创建聊天窗口、AI和托盘")
+            print(startup_trace.report())
+            print(startup_trace.to_json())
+            app.exit(0 if visible_ms <= budget_ms else 1)
+            return
+
+        # 对话记录：之后的消息都会持久化，最近的记录在后台读取后恢复到聊天窗口和上下文
+        history_config = config.section('history')
+        if history_config.get('enabled', True):
+            try:
+                store = ConversationStore(history_config.get('db_path', 'history.db'))
+            except Exception as e:
+                print(f"对话记录初始化失败: {str(e)}")
+                store = None
+            if store:
+                ai_manager.set_store(store)
+                chat_window.set_store(store)
+                app.aboutToQuit.connect(store.close)
+
+                def on_history_loaded(rows):
+                    chat_window.restore_history(rows)
+                    ai_manager.restore_history(rows)
+
+                restore_worker = Worker(store.recent, history_config.get('restore_messages', 50))
+                restore_worker.signals.finished.connect(on_history_loaded)
+                components.update(store=store, restore_worker=start_worker(restore_worker))
+
+        components["metrics_server"] = setup_metrics_export(config, app)
+
+        # 后台导入openai并预热连接，首条消息不再为此等待
+        components["preload_worker"] = start_worker(Worker(ai_manager.preload))
+        startup_trace.mark("创建聊天窗口、AI和托盘")
+        print_debug(startup_trace.report())
+
+        # 启动完成后再解码其余状态的动画（QPixmap只能在界面线程创建），不计入启动耗时
+        QTimer.singleShot(0, pet_window.animation_cache.preload)
+
+    QTimer.singleShot(0, finish_startup)
     
     print_debug("程序初始化完成，进入事件循环")
     
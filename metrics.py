@@ -0,0 +1,240 @@
+# 性能指标模块
+# 把每轮对话拆成计时阶段（span）并统计计数器，最近的轮次保存在环形缓冲区中，
+# 可导出为Prometheus文本格式或JSON，供托盘诊断面板、本地HTTP接口和文件导出使用
+
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import get_config
+
+# 阶段耗时直方图的桶上限（秒）
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+METRIC_PREFIX = "desktop_pet"
+
+def percentile(values, fraction):
+    """取已排序列表的分位数"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+class Turn:
+    """一轮对话的计时记录
+
+    metrics为None时只在本地记录（例如不经过send_message直接调用工具）
+    """
+
+    def __init__(self, metrics=None, turn_id=0):
+        self.metrics = metrics
+        self.id = turn_id
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration_ms = None
+        self.spans = []      # [(阶段名, 毫秒)]
+        self.counters = {}   # 计数器名 -> 数值
+
+    @contextmanager
+    def span(self, name):
+        """计时一个阶段"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, (time.perf_counter() - start) * 1000)
+
+    def add_span(self, name, duration_ms):
+        """记录一个阶段的耗时（毫秒），可以在工具线程中调用"""
+        self.spans.append((name, duration_ms))
+        if self.metrics:
+            self.metrics.observe(name, duration_ms)
+
+    def count(self, name, value=1):
+        """累加计数器"""
+        self.counters[name] = self.counters.get(name, 0) + value
+        if self.metrics:
+            self.metrics.count(name, value)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "spans": [{"name": name, "ms": round(duration, 3)} for name, duration in self.spans],
+            "counters": dict(self.counters)
+        }
+
+class Metrics:
+    """进程内指标
+
+    直方图和计数器从启动开始累计，最近max_turns轮的明细保存在环形缓冲区中
+    """
+
+    def __init__(self, max_turns=200):
+        self.lock = threading.Lock()
+        self.turns = deque(maxlen=max_turns)
+        self.next_turn_id = 0
+        self.counters = {}
+        self.histograms = {}  # 阶段名 -> {"buckets": [...], "sum": 秒, "count": 次数}
+        self.sources = {}  # 名称 -> 返回统计字典的函数（各模块自己维护的统计，如工具缓存）
+
+    def begin_turn(self):
+        """开始一轮新的计时"""
+        with self.lock:
+            self.next_turn_id += 1
+            turn = Turn(self, self.next_turn_id)
+            self.turns.append(turn)
+        self.count("turns")
+        return turn
+
+    def end_turn(self, turn):
+        """结束一轮计时，记录总耗时"""
+        turn.duration_ms = (time.perf_counter() - turn.start) * 1000
+        self.observe("turn", turn.duration_ms)
+
+    def last_turn(self):
+        """最近一轮（界面渲染等在回复返回后才发生的阶段记到这一轮上）"""
+        with self.lock:
+            return self.turns[-1] if self.turns else None
+
+    def record_span(self, name, duration_ms):
+        """把阶段耗时记到最近一轮上"""
+        turn = self.last_turn()
+        if turn:
+            turn.add_span(name, duration_ms)
+        else:
+            self.observe(name, duration_ms)
+
+    def observe(self, name, duration_ms):
+        """把一次阶段耗时计入直方图"""
+        seconds = duration_ms / 1000
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    histogram["buckets"][index] += 1
+            histogram["sum"] += seconds
+            histogram["count"] += 1
+
+    def count(self, name, value=1):
+        """累加全局计数器"""
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_source(self, name, function):
+        """登记一个统计来源，快照时调用function()取得当前统计"""
+        with self.lock:
+            self.sources[name] = function
+
+    def snapshot(self):
+        """汇总为字典：计数器、最近轮次中各阶段的分位数、最近轮次明细和各统计来源"""
+        with self.lock:
+            turns = [turn.to_dict() for turn in self.turns]
+            counters = dict(self.counters)
+            sources = dict(self.sources)
+
+        durations = {}
+        for turn in turns:
+            if turn["duration_ms"] is not None:
+                durations.setdefault("turn", []).append(turn["duration_ms"])
+            for span in turn["spans"]:
+                durations.setdefault(span["name"], []).append(span["ms"])
+
+        spans = {}
+        for name, values in durations.items():
+            values.sort()
+            spans[name] = {
+                "count": len(values),
+                "mean_ms": round(sum(values) / len(values), 3),
+                "p50_ms": round(percentile(values, 0.5), 3),
+                "p95_ms": round(percentile(values, 0.95), 3),
+                "max_ms": round(values[-1], 3)
+            }
+        stats = {}
+        for name, function in sources.items():
+            try:
+                stats[name] = function()
+            except Exception as e:
+                stats[name] = {"error": str(e)}
+        return {"timestamp": time.time(), "counters": counters, "spans": spans, "turns": turns,
+                "stats": stats}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self):
+        """导出为Prometheus文本格式"""
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((name, dict(h, buckets=list(h["buckets"])))
+                                for name, h in self.histograms.items())
+
+        lines = []
+        for name, value in counters:
+            metric = f"{METRIC_PREFIX}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+
+        metric = f"{METRIC_PREFIX}_span_seconds"
+        lines.append(f"# HELP {metric} 每轮对话各阶段的耗时")
+        lines.append(f"# TYPE {metric} histogram")
+        for name, histogram in histograms:
+            label = name.replace("\\", "\\\\").replace('"', '\\"')
+            for bound, bucket in zip(BUCKETS, histogram["buckets"]):
+                lines.append(f'{metric}_bucket{{span="{label}",le="{bound}"}} {bucket}')
+            lines.append(f'{metric}_bucket{{span="{label}",le="+Inf"}} {histogram["count"]}')
+            lines.append(f'{metric}_sum{{span="{label}"}} {histogram["sum"]:.6f}')
+            lines.append(f'{metric}_count{{span="{label}"}} {histogram["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        """写入文件：.json后缀为JSON，其余为Prometheus文本格式"""
+        content = self.to_json() if path.endswith(".json") else self.to_prometheus()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """/metrics 返回Prometheus文本格式，/metrics.json 返回JSON"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        metrics = get_metrics()
+        if self.path == "/metrics":
+            self.reply(metrics.to_prometheus(), "text/plain; version=0.0.4; charset=utf-8")
+        elif self.path == "/metrics.json":
+            self.reply(metrics.to_json(), "application/json; charset=utf-8")
+        else:
+            self.send_error(404)
+
+    def reply(self, content, content_type):
+        payload = content.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+def start_http_server(port):
+    """在后台线程启动只监听本机的指标接口，返回server"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+def get_metrics():
+    """获取共享的指标对象"""
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = Metrics(get_config().section('metrics').get('max_turns', 200))
+    return _metrics
@@ -0,0 +1,280 @@
+# 本地模拟接口
+# 兼容OpenAI chat.completions（含流式和tool_calls），回放录制的对话，
+# 可配置首字节延迟、片段间隔的分布和错误率，用于离线、可复现地压测AI调用链路
+#
+# 用法：python mock_server.py --port 8765 --recordings recordings.jsonl --ttfb uniform:200:600
+# 然后把config.json中的api_base改为 http://127.0.0.1:8765/v1
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from recording import last_user_text, load_recordings, recording_key
+
+DEFAULT_REPLY = "好的，这是一条来自本地模拟接口的固定回复。"
+
+def parse_distribution(spec):
+    """解析延迟分布（毫秒），返回采样函数 sample(rng)
+
+    支持 const:100、uniform:50:300、normal:200:50、exp:200（均值）、recorded（使用录制的延迟）
+    """
+    if not spec or spec == "recorded":
+        return None
+    kind, _, rest = spec.partition(":")
+    params = [float(value) for value in rest.split(":") if value]
+    if kind == "const" and len(params) == 1:
+        return lambda rng: params[0]
+    if kind == "uniform" and len(params) == 2:
+        return lambda rng: rng.uniform(params[0], params[1])
+    if kind == "normal" and len(params) == 2:
+        return lambda rng: max(0.0, rng.gauss(params[0], params[1]))
+    if kind == "exp" and len(params) == 1:
+        return lambda rng: rng.expovariate(1 / params[0]) if params[0] > 0 else 0.0
+    raise ValueError(f"无法解析的延迟分布: {spec}")
+
+class MockBackend:
+    """回放逻辑：按录制键精确匹配，其次按"match"子串匹配，都没有时返回固定回复"""
+
+    def __init__(self, recordings=None, ttfb=None, chunk_delay=None, error_rate=0.0,
+                 error_status=500, chunk_chars=4, seed=None):
+        self.ttfb = ttfb
+        self.chunk_delay = chunk_delay
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.chunk_chars = max(1, chunk_chars)
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+
+        self.by_key = {}
+        self.by_match = []
+        for entry in recordings or []:
+            if entry.get("match"):
+                self.by_match.append(entry)
+            elif entry.get("key"):
+                self.by_key.setdefault(entry["key"], entry)
+
+        # 请求和回放统计，由各个请求线程更新
+        self.requests = 0
+        self.replayed = 0
+        self.errors = 0
+        self.stats_lock = threading.Lock()
+
+    def sample(self, distribution, recorded_ms=None):
+        """按分布采样一次延迟（秒）；未配置分布时使用录制的延迟"""
+        if distribution is None:
+            return (recorded_ms or 0) / 1000
+        with self.rng_lock:
+            return distribution(self.rng) / 1000
+
+    def should_fail(self):
+        """按错误率决定本次请求是否返回错误，返回错误时计入统计"""
+        if self.error_rate <= 0:
+            return False
+        with self.rng_lock:
+            failed = self.rng.random() < self.error_rate
+        if failed:
+            with self.stats_lock:
+                self.errors += 1
+        return failed
+
+    def find(self, body):
+        """查找与请求对应的录制记录"""
+        messages = body.get("messages") or []
+        entry = self.by_key.get(recording_key(messages, body.get("tools")))
+        if entry is None and messages and messages[-1].get("role") == "user":
+            text = last_user_text(messages)
+            entry = next((e for e in self.by_match if e["match"] in text), None)
+        return entry
+
+    def respond(self, body):
+        """返回 (content, tool_calls, 录制的延迟)"""
+        entry = self.find(body)
+        with self.stats_lock:
+            self.requests += 1
+            if entry:
+                self.replayed += 1
+        if entry:
+            response = entry["response"]
+            tool_calls = response.get("tool_calls") or []
+            if body.get("tool_choice") == "none" or not body.get("tools"):
+                tool_calls = []
+            # 工具调用id每次重新生成，和真实接口一样
+            tool_calls = [dict(tool_call, id=f"call_{uuid.uuid4().hex[:24]}") for tool_call in tool_calls]
+            return response.get("content") or "", tool_calls, entry.get("latency") or {}
+
+        messages = body.get("messages") or []
+        if messages and messages[-1].get("role") == "tool":
+            # 没有录制的工具结果轮次：把工具结果原样复述，保证工具调用链路能走完
+            results = [m.get("content", "") for m in messages if m.get("role") == "tool"]
+            return "工具执行结果：" + "；".join(str(result) for result in results[-3:]), [], {}
+        return DEFAULT_REPLY, [], {}
+
+class MockHandler(BaseHTTPRequestHandler):
+    """OpenAI兼容的HTTP接口"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端中止了连接（例如落败的对冲请求），保持长连接时在读取下一个请求处出错
+            pass
+
+    @property
+    def backend(self):
+        return self.server.backend
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self.send_json(200, {"object": "list", "data": [{"id": "mock-model", "object": "model"}]})
+        else:
+            self.send_json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self.send_json(400, {"error": {"message": "invalid json", "type": "invalid_request_error"}})
+            return
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+            return
+
+        backend = self.backend
+        if backend.should_fail():
+            headers = {"Retry-After": "1"} if backend.error_status == 429 else {}
+            self.send_json(backend.error_status, {"error": {
+                "message": "模拟的接口错误", "type": "server_error", "code": backend.error_status
+            }}, headers)
+            return
+
+        content, tool_calls, latency = backend.respond(body)
+        time.sleep(backend.sample(backend.ttfb, latency.get("ttfb_ms")))
+        model = body.get("model", "mock-model")
+        if body.get("stream"):
+            self.send_stream(model, content, tool_calls, latency)
+        else:
+            if backend.ttfb is None and latency.get("total_ms") and latency.get("ttfb_ms") is not None:
+                # 回放录制延迟时，非流式回复要等到整段回复生成完
+                time.sleep(max(0, latency["total_ms"] - latency["ttfb_ms"]) / 1000)
+            message = {"role": "assistant", "content": content or None}
+            if tool_calls:
+                message["tool_calls"] = tool_calls
+            self.send_json(200, {
+                "id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "object": "chat.completion",
+                "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": message,
+                             "finish_reason": "tool_calls" if tool_calls else "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(content), "total_tokens": len(content)}
+            })
+
+    def send_stream(self, model, content, tool_calls, latency):
+        """以SSE分片发送回复，工具调用按index分片"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        backend = self.backend
+        pieces = [content[i:i + backend.chunk_chars] for i in range(0, len(content), backend.chunk_chars)]
+        deltas = [{"role": "assistant", "content": piece} for piece in pieces]
+        for index, tool_call in enumerate(tool_calls):
+            deltas.append({"tool_calls": [{"index": index, "id": tool_call["id"], "type": "function",
+                                           "function": {"name": tool_call["function"]["name"], "arguments": ""}}]})
+            arguments = tool_call["function"].get("arguments") or ""
+            for i in range(0, len(arguments), 16):
+                deltas.append({"tool_calls": [{"index": index, "function": {"arguments": arguments[i:i + 16]}}]})
+
+        # 回放录制延迟时，把首字节之后的耗时平均分到各个片段
+        recorded_gap = None
+        if backend.chunk_delay is None and latency.get("total_ms") and latency.get("ttfb_ms") is not None:
+            recorded_gap = max(0, latency["total_ms"] - latency["ttfb_ms"]) / max(1, len(deltas))
+
+        try:
+            for number, delta in enumerate(deltas):
+                if number:
+                    time.sleep(backend.sample(backend.chunk_delay, recorded_gap))
+                self.write_chunk(completion_id, model, delta, None)
+            self.write_chunk(completion_id, model, {}, "tool_calls" if tool_calls else "stop")
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def write_chunk(self, completion_id, model, delta, finish_reason):
+        chunk = {
+            "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+            "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+        }
+        self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def send_json(self, status, data, headers=None):
+        payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端已断开（例如落败的对冲请求被中止）
+            self.close_connection = True
+
+def start_server(backend=None, host="127.0.0.1", port=0):
+    """在后台线程启动模拟接口，返回(server, api_base)"""
+    server = ThreadingHTTPServer((host, port), MockHandler)
+    server.daemon_threads = True
+    server.backend = backend or MockBackend()
+    threading.Thread(target=server.serve_forever, name="mock-server", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI兼容的本地模拟接口")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--recordings", help="AI录制模式生成的JSONL文件")
+    parser.add_argument("--ttfb", default="const:0",
+                        help="首字节延迟分布（毫秒），如 uniform:200:600；recorded表示使用录制的延迟")
+    parser.add_argument("--chunk-delay", default="const:0", help="流式片段之间的延迟分布（毫秒）")
+    parser.add_argument("--chunk-chars", type=int, default=4, help="每个流式片段的字符数")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回错误的比例（0-1）")
+    parser.add_argument("--error-status", type=int, default=500, help="错误响应的HTTP状态码，如429、503")
+    parser.add_argument("--seed", type=int, help="随机种子，固定后延迟和错误序列可复现")
+    args = parser.parse_args()
+
+    recordings = load_recordings(args.recordings) if args.recordings else []
+    backend = MockBackend(
+        recordings=recordings,
+        ttfb=parse_distribution(args.ttfb),
+        chunk_delay=parse_distribution(args.chunk_delay),
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        chunk_chars=args.chunk_chars,
+        seed=args.seed
+    )
+    server, api_base = start_server(backend, args.host, args.port)
+    print(f"模拟接口已启动: {api_base}（{len(recordings)}条录制记录）")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print(f"共{backend.requests}次请求，回放{backend.replayed}次，模拟错误{backend.errors}次")
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -1,52 +1,155 @@
 # 宠物窗口模块
 
-import os
-import sys
-import json
 import time
-from pathlib import Path
-from PyQt6.QtWidgets import QWidget, QLabel, QVBoxLayout
-from PyQt6.QtCore import Qt, QPoint, QTimer, QSize
-from PyQt6.QtGui import QMovie, QPixmap
-
-# 从config.json读取debug配置
-def load_debug_config():
-    try:
-        with open('config.json', 'r', encoding='utf-8') as f:
-            config = json.load(f)
-            return config.get('debug', False)
-    except Exception:
-        return False
-
-DEBUG = load_debug_config()
+from collections import OrderedDict
+from PyQt6.QtWidgets import QWidget, QVBoxLayout
+from PyQt6.QtCore import Qt, QBuffer, QByteArray, QIODevice, QPoint, QRect, QTimer, QSize
+from PyQt6.QtGui import QImageReader, QPixmap
+
+from bundle import get_asset_store
+from config import get_config
+from sprite import SpriteView, alpha_mask, frame_damage
+import power
 
 def print_debug(message):
     """打印调试信息"""
-    if DEBUG:
+    if get_config().debug:
         print(f"[PET DEBUG] {message}")
 
-def get_resource_path(relative_path):
-    """获取资源文件的正确路径，兼容开发环境和打包后的环境"""
-    if hasattr(sys, '_MEIPASS'):
-        # 打包后的环境
-        base_path = Path(sys._MEIPASS)
-    else:
-        # 开发环境
-        base_path = Path(__file__).parent
-
-    # 尝试不同的路径
-    paths_to_try = [
-        base_path / relative_path,  # 打包后的路径
-        base_path / '..' / relative_path,  # 开发环境路径
-        Path(relative_path)  # 相对路径
-    ]
-
-    for path in paths_to_try:
-        if path.exists():
-            return str(path)
-
-    # 如果都找不到，返回原始路径
-    return relative_path
+class Animation:
+    """一个状态的动画：预先缩放好的帧及每帧的显示时长（毫秒）
+
+    damage[i]是从上一帧切换到第i帧时变化的区域，masks[i]是第i帧的透明遮罩（未启用时为None）
+    """
+
+    def __init__(self, frames, delays, damage=None, masks=None):
+        self.frames = frames
+        self.delays = delays
+        self.damage = damage
+        self.masks = masks
+        # 按32位像素估算占用的内存
+        self.nbytes = sum(frame.width() * frame.height() * 4 for frame in frames)
+
+    def damage_between(self, previous, current):
+        """从第previous帧切换到第current帧需要重绘的区域，None表示整帧重绘"""
+        if previous is None or not self.damage:
+            return None
+        rect = QRect()
+        index = previous
+        while index != current:
+            index = (index + 1) % len(self.frames)
+            rect = rect.united(self.damage[index])
+        return rect
+
+class AnimationCache:
+    """宠物动画缓存
+
+    每个状态的图片只从磁盘读取、解码和缩放一次，之后切换状态直接复用内存中的帧；
+    总占用超过max_bytes时按最近最少使用淘汰其他状态
+    """
+
+    def __init__(self, pet_states, size=QSize(120, 120), max_bytes=32 * 1024 * 1024, masks=False):
+        self.pet_states = pet_states
+        self.size = size
+        self.max_bytes = max_bytes
+        self.masks = masks
+        self.animations = OrderedDict()
+        self.total_bytes = 0
+
+    def get(self, state_name):
+        """获取状态对应的动画，首次使用时加载"""
+        animation = self.animations.get(state_name)
+        if animation:
+            self.animations.move_to_end(state_name)
+            return animation
+
+        animation = self.load(state_name)
+        if animation:
+            self.animations[state_name] = animation
+            self.total_bytes += animation.nbytes
+            self.evict(keep=state_name)
+        return animation
+
+    def load(self, state_name):
+        """解码一个状态的动画，图片数据来自资源包或散文件"""
+        if state_name not in self.pet_states:
+            return None
+        file_path = self.pet_states[state_name]
+        data = get_asset_store().read(file_path)
+        if data is None:
+            print_debug(f"文件不存在: {file_path}")
+            return None
+
+        images = []
+        delays = []
+        if file_path.lower().endswith('.gif'):# GIF动画，解码时直接缩放
+            buffer = QBuffer()
+            buffer.setData(QByteArray(data))
+            buffer.open(QIODevice.OpenModeFlag.ReadOnly)
+            reader = QImageReader(buffer)
+            reader.setScaledSize(self.size)
+            while reader.canRead():
+                image = reader.read()
+                if image.isNull():
+                    break
+                images.append(image)
+                delay = reader.nextImageDelay()
+                delays.append(delay if delay > 0 else 100)
+            buffer.close()
+        else:# 静态图片
+            pixmap = QPixmap()
+            if pixmap.loadFromData(data):
+                images.append(pixmap.scaled(self.size, Qt.AspectRatioMode.KeepAspectRatio,
+                                            Qt.TransformationMode.SmoothTransformation).toImage())
+                delays.append(0)
+
+        if not images:
+            print_debug(f"图片解码失败: {file_path}")
+            return None
+
+        # 预先算好相邻帧的变化区域（第0帧与最后一帧比较，循环播放时使用）和遮罩
+        damage = [frame_damage(images[index - 1], image) for index, image in enumerate(images)]
+        masks = [alpha_mask(image) for image in images] if self.masks else None
+        frames = [QPixmap.fromImage(image) for image in images]
+        print_debug(f"已缓存动画: {state_name}，{len(frames)}帧")
+        return Animation(frames, delays, damage, masks)
+
+    def evict(self, keep=None):
+        """超过内存上限时淘汰最久未使用的动画"""
+        for state_name in list(self.animations):
+            if self.total_bytes <= self.max_bytes:
+                break
+            if state_name == keep:
+                continue
+            self.total_bytes -= self.animations.pop(state_name).nbytes
+            print_debug(f"动画缓存超过上限，淘汰: {state_name}")
+
+    def estimate_bytes(self, state_name):
+        """不解码，按资源包索引中的尺寸和帧数估算一个状态缩放后的帧占用；没有索引信息时返回None"""
+        info = get_asset_store().info(self.pet_states[state_name])
+        if not info or not info.get("width") or not info.get("height"):
+            return None
+        if self.pet_states[state_name].lower().endswith('.gif'):
+            # GIF解码时直接缩放到目标尺寸
+            width, height = self.size.width(), self.size.height()
+        else:
+            scale = min(self.size.width() / info["width"], self.size.height() / info["height"])
+            width, height = info["width"] * scale, info["height"] * scale
+        return int(info["frames"] * width * height * 4)
+
+    def preload(self):
+        """预先加载所有状态的动画（在不超过内存上限的前提下）
+
+        能从资源包索引估算占用时，放不下的状态直接跳过，不必先解码再淘汰
+        """
+        for state_name in self.pet_states:
+            if state_name in self.animations or self.total_bytes >= self.max_bytes:
+                continue
+            estimate = self.estimate_bytes(state_name)
+            if estimate is not None and self.total_bytes + estimate > self.max_bytes:
+                print_debug(f"跳过预加载 {state_name}：预计占用{estimate / 1024 / 1024:.1f}MB，超过缓存上限")
+                continue
+            self.get(state_name)
 
 class Pet(QWidget):
     """宠物窗口类"""
@@ -56,11 +159,35 @@ class Pet(QWidget):
         
         # 保存配置
         self.pet_states = config.get('pet_states', {})
-        self.idle_timeout = config.get('idle_timeout_seconds', 60) * 1000  # 转换为毫秒
+        self.idle_timeout = int(config.get('idle_timeout_seconds', 60) * 1000)  # 转换为毫秒（QTimer只接受整数）
         
+        # 动画缓存，所有状态的帧只解码一次
+        self.animation_cache = AnimationCache(
+            self.pet_states,
+            max_bytes=config.get('animation_cache_mb', 32) * 1024 * 1024,
+            masks=config.get('sprite_mask', False)
+        )
+
         # 当前状态
         self.current_state = "idle"
-        self.current_movie = None
+        self.current_animation = None
+        self.frame_index = 0
+        # 正在显示的帧，None表示下一帧需要整帧重绘
+        self.shown_index = None
+
+        # 逐帧播放计时器
+        self.frame_timer = QTimer(self)
+        self.frame_timer.setSingleShot(True)
+        self.frame_timer.timeout.connect(self.next_frame)
+
+        # 省电：睡眠/空闲时降低帧率，使用电池或CPU繁忙时进一步节流，
+        # 窗口隐藏或前台有全屏程序时暂停播放
+        self.power_config = config.get('power', {})
+        self.on_battery = False
+        self.cpu_busy = False
+        self.covered = False
+        self.power_timer = QTimer(self)
+        self.power_timer.timeout.connect(self.update_power_state)
         
         # 拖拽相关
         self.is_dragging = False
@@ -106,14 +233,35 @@ class Pet(QWidget):
         layout = QVBoxLayout()
         layout.setContentsMargins(0, 0, 0, 0)
         
-        # 宠物图像标签
-        self.pet_label = QLabel()
-        self.pet_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.pet_label.setMinimumSize(150, 150)
-        
-        layout.addWidget(self.pet_label)
+        # 宠物精灵，只重绘帧间变化的区域
+        self.sprite = SpriteView()
+        self.sprite.setMinimumSize(150, 150)
+
+        layout.addWidget(self.sprite)
         self.setLayout(layout)
     
+    def apply_config(self, config):
+        """应用热重载后的配置"""
+        self.idle_timeout = int(config.get('idle_timeout_seconds', 60) * 1000)
+        self.power_config = config.get('power', {})
+        if self.power_timer.isActive():
+            self.power_timer.start(int(self.power_config.get('check_interval_seconds', 10) * 1000))
+        pet_states = config.get('pet_states', {})
+        cache_bytes = config.get('animation_cache_mb', 32) * 1024 * 1024
+        masks = config.get('sprite_mask', False)
+        if (pet_states != self.pet_states or cache_bytes != self.animation_cache.max_bytes
+                or masks != self.animation_cache.masks):
+            # 动画文件变化后重建缓存并重新播放当前状态
+            self.pet_states = pet_states
+            self.animation_cache = AnimationCache(pet_states, max_bytes=cache_bytes, masks=masks)
+            if not masks:
+                self.sprite.clear_mask()
+            state_name = self.current_state
+            self.current_animation = None
+            self.set_state(state_name)
+        if self.current_state != "sleeping":
+            self.start_idle_timer()
+
     def set_chat_window(self, chat_window):
         """设置聊天窗口引用"""
         self.chat_window = chat_window
@@ -121,41 +269,110 @@ class Pet(QWidget):
     def set_state(self, state_name):
         """设置宠物状态"""
         # 如果状态相同且动画正在播放，不做改变
-        if (self.current_state == state_name and 
-            self.current_movie and 
-            self.current_movie.state() == QMovie.MovieState.Running):
+        if self.current_state == state_name and self.current_animation:
             return
         
         print_debug(f"切换状态: {self.current_state} -> {state_name}")
         self.current_state = state_name
         # 停止当前动画
-        if self.current_movie:
-            self.current_movie.stop()
-            self.current_movie = None
-        # 获取状态对应的文件路径
-        if state_name in self.pet_states:
-            file_path = get_resource_path(self.pet_states[state_name])
-            # 检查文件是否存在
-            if not os.path.exists(file_path):
-                print_debug(f"文件不存在: {file_path}")
-                return
-            # 根据文件类型处理
-            if file_path.lower().endswith('.gif'):# GIF动画
-                self.current_movie = QMovie(file_path)
-                self.current_movie.setScaledSize(QSize(120, 120))
-                self.pet_label.setMovie(self.current_movie)
-                self.current_movie.start()
-                print_debug(f"播放GIF动画: {file_path}")
-            else:# 静态图片
-                pixmap = QPixmap(file_path)
-                pixmap = pixmap.scaled(120, 120, Qt.AspectRatioMode.KeepAspectRatio, 
-                                     Qt.TransformationMode.SmoothTransformation)
-                self.pet_label.setPixmap(pixmap)
-                print_debug(f"显示静态图片: {file_path}")
+        self.frame_timer.stop()
+        self.current_animation = self.animation_cache.get(state_name)
+        if self.current_animation:
+            # 从缓存的第一帧开始播放，换了动画需要整帧重绘
+            self.frame_index = -1
+            self.shown_index = None
+            self.next_frame()
         # 如果不是睡眠状态，重置空闲计时器
         if state_name != "sleeping":
             self.start_idle_timer()
     
+    def next_frame(self):
+        """显示下一帧，并按该帧时长安排再下一帧
+
+        帧率受限时跳过中间的帧，动画整体速度不变，只是画面更新次数减少
+        """
+        animation = self.current_animation
+        if not animation:
+            return
+        count = len(animation.frames)
+        self.frame_index = (self.frame_index + 1) % count
+        self.show_frame(animation, self.frame_index)
+        if count <= 1 or self.is_paused():
+            return
+
+        min_interval = self.min_frame_interval()
+        if min_interval is None:
+            # 帧率为0：停在当前帧
+            return
+        duration = animation.delays[self.frame_index]
+        for _ in range(count - 1):
+            if duration >= min_interval:
+                break
+            self.frame_index = (self.frame_index + 1) % count
+            duration += animation.delays[self.frame_index]
+        self.frame_timer.start(max(duration, int(min_interval)))
+
+    def show_frame(self, animation, index):
+        """显示第index帧，只重绘与上一次显示的帧不同的区域"""
+        damage = animation.damage_between(self.shown_index, index)
+        mask = animation.masks[index] if animation.masks else None
+        self.sprite.set_frame(animation.frames[index], damage, mask)
+        self.shown_index = index
+
+    def min_frame_interval(self):
+        """当前允许的最短帧间隔（毫秒），不限制时为0，帧率为0时返回None"""
+        config = self.power_config
+        caps = []
+        state_fps = {"sleeping": config.get('sleeping_fps', 2), "idle": config.get('idle_fps', 10)}
+        if self.current_state in state_fps:
+            caps.append(state_fps[self.current_state])
+        if self.on_battery:
+            caps.append(config.get('battery_fps', 6))
+        if self.cpu_busy:
+            caps.append(config.get('busy_fps', 4))
+        if not caps:
+            return 0
+        fps = min(caps)
+        return None if fps <= 0 else 1000 / fps
+
+    def is_paused(self):
+        """窗口不可见或被全屏程序遮挡时暂停动画"""
+        return not self.isVisible() or self.covered
+
+    def resume_animation(self):
+        """恢复播放（从暂停恢复或帧率限制变化后）"""
+        if self.current_animation and not self.is_paused():
+            self.frame_timer.stop()
+            self.next_frame()
+
+    def update_power_state(self):
+        """定期检查电源、CPU和全屏状态，变化时调整动画"""
+        config = self.power_config
+        on_battery = power.on_battery()
+        cpu_busy = power.cpu_percent() >= config.get('busy_cpu_percent', 80)
+        covered = config.get('pause_when_fullscreen', True) and power.is_foreground_fullscreen()
+        if (on_battery, cpu_busy, covered) == (self.on_battery, self.cpu_busy, self.covered):
+            return
+        print_debug(f"电源状态变化: 电池={on_battery}, CPU繁忙={cpu_busy}, 全屏遮挡={covered}")
+        self.on_battery, self.cpu_busy, self.covered = on_battery, cpu_busy, covered
+        if covered:
+            self.frame_timer.stop()
+        else:
+            self.resume_animation()
+
+    def showEvent(self, event):
+        """窗口显示时恢复动画和电源状态检查"""
+        super().showEvent(event)
+        self.power_timer.start(int(self.power_config.get('check_interval_seconds', 10) * 1000))
+        self.resume_animation()
+
+    def hideEvent(self, event):
+        """窗口隐藏时停止所有定时刷新"""
+        super().hideEvent(event)
+        self.frame_timer.stop()
+        self.power_timer.stop()
+        print_debug("宠物窗口已隐藏，暂停动画")
+
     def start_idle_timer(self):
         """启动空闲计时器"""
         self.idle_timer.stop()
@@ -189,6 +406,8 @@ class Pet(QWidget):
                 self.chat_window.hide()
                 print_debug("隐藏聊天窗口")
             else:
+                # 先在后台预热连接，握手和用户输入同时进行
+                self.chat_window.warm_up_connection()
                 chat_pos = self.get_chat_position()
                 self.chat_window.move(chat_pos)
                 self.chat_window.show()
@@ -0,0 +1,16 @@
+# 工具插件目录
+# 每个工具一个模块，由tool_registry扫描。模块中与文件同名的函数就是工具实现：
+#
+#   SIDE_EFFECT = True   # 可选：有副作用的工具，结果不参与回复缓存
+#   TIMEOUT = 10         # 可选：执行超时（秒），默认使用tool_timeout_seconds
+#
+#   def set_volume(level: int) -> str:
+#       """设置系统音量，允许的范围是0-100
+#
+#       参数:
+#           level: 音量级别，0-100
+#       """
+#
+# 工具描述和参数schema由类型注解和文档字符串生成，没有默认值的参数为必填；
+# 模块在第一次调用时才导入，依赖（requests、pyautogui等）应在模块中导入。
+# 以下划线开头的文件不会被当作工具
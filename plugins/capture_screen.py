@@ -0,0 +1,105 @@
+# 工具：截取屏幕交给AI分析（需要pyautogui和Pillow）
+
+from typing import Literal
+
+from config import get_config
+from tool_registry import print_debug
+
+TIMEOUT = 15
+
+# 截图编码格式对应的PIL格式名和MIME类型
+IMAGE_FORMATS = {
+    'jpeg': ('JPEG', 'image/jpeg'),
+    'webp': ('WEBP', 'image/webp'),
+    'png': ('PNG', 'image/png')
+}
+
+def get_capture_region(region):
+    """把区域配置转换为pyautogui使用的(left, top, width, height)，整屏返回None"""
+    if region == 'active_window':
+        import pyautogui
+        try:
+            window = pyautogui.getActiveWindow()
+        except Exception as e:
+            print_debug(f"获取活动窗口失败，改为截取整个屏幕: {str(e)}")
+            return None
+        if window and window.width > 0 and window.height > 0:
+            return (max(window.left, 0), max(window.top, 0), window.width, window.height)
+        return None
+    if isinstance(region, (list, tuple)) and len(region) == 4:
+        return tuple(int(value) for value in region)
+    return None
+
+def encode_screenshot(image, screenshot_config):
+    """把截图缩放并编码为data URL，返回(data_url, 编码后尺寸)
+
+    image会被原地缩小，调用方不应再使用原图
+    """
+    import io
+    import base64
+    from PIL import Image
+
+    max_width = screenshot_config.get('max_width', 1280)
+    max_height = screenshot_config.get('max_height', 1280)
+    image_format = screenshot_config.get('format', 'jpeg').lower()
+    quality = screenshot_config.get('quality', 70)
+    pil_format, mime_type = IMAGE_FORMATS.get(image_format, IMAGE_FORMATS['jpeg'])
+
+    # 原地缩小到最大尺寸以内（thumbnail不会放大，也不会生成额外副本）
+    image.thumbnail((max_width, max_height), Image.Resampling.BILINEAR)
+    if pil_format != 'PNG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    # 编码后直接对缓冲区做Base64，避免再复制一份字节数据
+    image_buffer = io.BytesIO()
+    if pil_format == 'PNG':
+        image.save(image_buffer, format=pil_format)
+    else:
+        image.save(image_buffer, format=pil_format, quality=quality)
+    base64_string = base64.b64encode(image_buffer.getbuffer()).decode('ascii')
+    return f"data:{mime_type};base64,{base64_string}", image.size
+
+def capture_screen(region: Literal["full", "active_window"] = None) -> dict | str:
+    """截取当前屏幕并且分析图片内容
+
+    参数:
+        region: 截图范围：full为整个屏幕，active_window为当前活动窗口，默认按设置
+    """
+    # 使用pyautogui.screenshot()截取屏幕（整屏、活动窗口或指定区域），
+    # 缩放到配置的最大尺寸并用有损格式编码，返回交给AI分析的图片数据
+    try:
+        # 检查导入所需模块
+        import pyautogui
+        
+        screenshot_config = get_config().section('screenshot')
+        region = get_capture_region(region or screenshot_config.get('region', 'full'))
+
+        print_debug(f"开始使用pyautogui.screenshot()截取屏幕，区域: {region or '整个屏幕'}")
+        
+        # 使用pyautogui截取屏幕，返回PIL Image对象
+        screenshot_img = pyautogui.screenshot(region=region)
+        
+        if screenshot_img is None:
+            return "错误：截屏失败，pyautogui.screenshot()返回None"
+        
+        print_debug(f"截屏成功，图片尺寸: {screenshot_img.size}")
+
+        data_url, size = encode_screenshot(screenshot_img, screenshot_config)
+        
+        print_debug(f"成功：已截取屏幕图片并转换为Base64 (尺寸: {size}, 长度: {len(data_url)})")
+        
+        # 返回交给AI分析的图片数据
+        return {
+            "type": "image_for_ai",
+            "data_url": data_url,
+            "detail": screenshot_config.get('detail', 'auto'),
+            "message": "截图完成"
+        }
+        
+    except ImportError as e:
+        missing_module = str(e).split("'")[-2] if "'" in str(e) else "未知模块"
+        return f"错误：缺少依赖库 {missing_module}，请安装：pip install pyautogui Pillow"
+        
+    except Exception as e:
+        print_debug(f"屏幕截取失败: {str(e)}")
+        return f"错误：屏幕截取失败 - {str(e)}"
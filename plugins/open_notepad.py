@@ -0,0 +1,14 @@
+# 工具：打开记事本（新工具可以参照这个模板编写）
+
+from tool_registry import print_debug
+
+SIDE_EFFECT = True
+
+def open_notepad() -> str:
+    """打开系统记事本应用"""
+    try:
+        #代码主体
+        return "成功：记事本已启动"
+    except Exception as e:
+        print_debug(f"错误日志: {str(e)}")
+        return f"错误：错误日志 - {str(e)}"
@@ -0,0 +1,24 @@
+# 工具：打开系统程序
+
+import subprocess
+
+from tool_registry import print_debug
+
+SIDE_EFFECT = True
+
+def open_program(program_name: str) -> str:
+    """打开系统程序，需要注意安全性，不要打开敏感进程
+
+    参数:
+        program_name: 程序名称，必须是英文名，例如notepad.exe,cmd.exe等
+    """
+    program_name = program_name.strip()
+
+    if not program_name:
+        return "错误：没有指定程序名称"
+    try:
+        subprocess.Popen([program_name], shell=False)
+        return f"成功：程序 {program_name} 已启动"
+    except Exception as e:
+        print_debug(f"程序启动失败: {str(e)}")
+        return f"错误：程序启动失败 - {str(e)}"
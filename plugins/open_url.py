@@ -0,0 +1,30 @@
+# 工具：在浏览器中打开网址
+
+import webbrowser
+
+from tool_registry import print_debug
+
+SIDE_EFFECT = True
+
+def open_url(url: str) -> str:
+    """在默认浏览器中打开一个URL
+
+    参数:
+        url: 要打开的完整URL
+    """
+    try:
+        url = url.strip()
+
+        if not url:
+            return "错误：没有指定网址"
+
+        # 如果没有协议，自动添加https://
+        if not (url.startswith('http://') or url.startswith('https://')):
+            url = 'https://' + url
+
+        webbrowser.open(url)
+        return f"成功：已在浏览器中打开 {url}"
+
+    except Exception as e:
+        print_debug(f"网址打开失败: {str(e)}")
+        return f"错误：网址打开失败 - {str(e)}"
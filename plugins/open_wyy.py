@@ -0,0 +1,30 @@
+# 工具：打开网易云音乐
+
+import os
+import subprocess
+
+from tool_registry import print_debug
+
+SIDE_EFFECT = True
+
+def open_wyy() -> str:
+    """打开网易云应用,如果网易云音乐软件打不开"""
+    try:
+        found_path = None
+        path=["C:\\Program Files\\Netease\\","C:\\Program Files (x86)\\Netease\\","D:\\","E:\\","F:\\","G:\\"]
+        for p in path:
+            wyy_path = os.path.join(p, "CloudMusic", "cloudmusic.exe")
+            if os.path.exists(wyy_path):
+                found_path = wyy_path  #找到后的网易云地址
+                break
+        #如果你的网易云音乐安装在自定义路径，可以注释掉以上内容，直接赋值found_path为你网易云主程序的绝对路径
+        if found_path:
+            subprocess.Popen([found_path])
+            return "成功：网易云音乐已启动"
+        else:
+            # 遍历完所有路径都没找到
+            print_debug("网易云音乐可执行文件未找到。请检查安装路径。")
+            return "错误：网易云音乐可执行文件未找到。请检查安装路径。你可以询问用户要不要打开网页版"
+    except Exception as e:
+        print_debug(f"网易云启动失败: {str(e)}，或者告诉用户要不要打开网页版")
+        return f"错误：网易云启动失败 - {str(e)}，你可以询问用户要不要打开网页版"
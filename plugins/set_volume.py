@@ -0,0 +1,40 @@
+# 工具：设置系统音量（需要pycaw，仅Windows）
+
+from tool_registry import print_debug
+
+SIDE_EFFECT = True
+
+def set_volume(level: int) -> str:
+    """设置系统音量，允许的范围是0-100
+
+    参数:
+        level: 音量级别，0-100
+    """
+    try:
+        # 检查音量范围
+        if not isinstance(level, int) or level < 0 or level > 100:
+            return "错误：音量值必须是0-100之间的整数"
+
+        try:
+            # 使用pycaw库设置音量
+            from ctypes import cast, POINTER
+            from comtypes import CLSCTX_ALL
+            from pycaw.pycaw import AudioUtilities, IAudioEndpointVolume
+
+            # 获取音频设备
+            devices = AudioUtilities.GetSpeakers()
+            interface = devices.Activate(IAudioEndpointVolume._iid_, CLSCTX_ALL, None)
+            volume = cast(interface, POINTER(IAudioEndpointVolume))
+
+            # 设置音量（0-100转换为0.0-1.0）
+            volume_scalar = level / 100.0
+            volume.SetMasterVolumeLevelScalar(volume_scalar, None)
+
+            return f"成功：系统音量已设置为 {level}%"
+
+        except ImportError:
+            return "错误：缺少pycaw库，无法设置音量"
+
+    except Exception as e:
+        print_debug(f"音量设置失败: {str(e)}")
+        return f"错误：音量设置失败 - {str(e)}"
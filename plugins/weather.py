@@ -0,0 +1,68 @@
+# 工具：查询天气（默认使用高德地图API）
+
+import threading
+
+from config import get_config
+from tool_registry import print_debug
+
+TIMEOUT = 10
+
+# 共享的HTTP会话（保持长连接，避免每次查询都重新建立TCP+TLS连接）
+_http_session = None
+_http_session_lock = threading.Lock()
+
+def get_http_session():
+    """获取共享的requests会话"""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _http_session = session
+        return _http_session
+
+def fetch_weather(city):
+    """向天气接口查询一个城市的实时天气"""
+    # 默认使用高德地图API查询天气，api_url可以指向本地的测试服务
+    weather_config = get_config().section('weather')
+    url = weather_config.get('api_url', 'https://restapi.amap.com/v3/weather/weatherInfo')
+    api_key = weather_config.get('api_key', 'your_api_key')
+    timeout = weather_config.get('timeout_seconds', 10)
+
+    response = get_http_session().get(url, params={"city": city, "key": api_key}, timeout=timeout)
+    data = response.json()
+    if data.get('status') == '1' and data.get('lives'):
+        weather_info = data['lives'][0]
+        city_name = weather_info.get('city', city)
+        weather_desc = weather_info.get('weather', '未知')
+        temperature = weather_info.get('temperature', '未知')
+        humidity = weather_info.get('humidity', '未知')
+        wind_direction = weather_info.get('winddirection', '未知')
+        wind_power = weather_info.get('windpower', '未知')
+
+        return f"{city_name}天气：{weather_desc}，温度{temperature}°C，湿度{humidity}%，{wind_direction}风{wind_power}级"
+    return f"错误：无法获取{city}的天气信息"
+
+def weather(city: str) -> str:
+    """查天气，需要传入城市名
+
+    参数:
+        city: 要查询的城市
+    """
+    # 结果缓存和并发查询合并由config.json中weather的cache策略统一处理
+    try:
+        city = city.strip()
+
+        if not city:
+            return "错误：没有指定城市名称"
+
+        return fetch_weather(city)
+
+    except Exception as e:
+        print_debug(f"天气查询失败: {str(e)}")
+        return f"错误：天气查询失败 - {str(e)}"
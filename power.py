@@ -0,0 +1,80 @@
+# 电源状态模块
+# 判断是否使用电池、系统CPU是否繁忙、前台是否有全屏程序，供宠物动画降低帧率或暂停
+# psutil为可选依赖，未安装时不做电池和CPU相关的节流
+
+import os
+import sys
+
+_psutil = None
+
+def get_psutil():
+    """首次使用时才导入psutil，未安装时返回None"""
+    global _psutil
+    if _psutil is None:
+        try:
+            import psutil
+            _psutil = psutil
+        except ImportError:
+            _psutil = False
+    return _psutil or None
+
+def on_battery():
+    """是否正在使用电池供电（无法判断时返回False）"""
+    psutil = get_psutil()
+    if psutil is None:
+        return False
+    try:
+        battery = psutil.sensors_battery()
+    except Exception:
+        return False
+    return battery is not None and not battery.power_plugged
+
+def cpu_percent():
+    """自上次调用以来的系统CPU占用率（不阻塞），无法获取时返回0"""
+    psutil = get_psutil()
+    if psutil is None:
+        return 0.0
+    try:
+        return psutil.cpu_percent(interval=None)
+    except Exception:
+        return 0.0
+
+def is_foreground_fullscreen():
+    """前台是否是其他程序的全屏窗口（目前仅支持Windows）"""
+    if sys.platform != "win32":
+        return False
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class MONITORINFO(ctypes.Structure):
+            _fields_ = [("cbSize", wintypes.DWORD), ("rcMonitor", wintypes.RECT),
+                        ("rcWork", wintypes.RECT), ("dwFlags", wintypes.DWORD)]
+
+        user32 = ctypes.windll.user32
+        hwnd = user32.GetForegroundWindow()
+        if not hwnd or hwnd in (user32.GetDesktopWindow(), user32.GetShellWindow()):
+            return False
+
+        # 自己的窗口和桌面不算
+        pid = wintypes.DWORD()
+        user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
+        if pid.value == os.getpid():
+            return False
+        class_name = ctypes.create_unicode_buffer(64)
+        user32.GetClassNameW(hwnd, class_name, 64)
+        if class_name.value in ("WorkerW", "Progman"):
+            return False
+
+        rect = wintypes.RECT()
+        user32.GetWindowRect(hwnd, ctypes.byref(rect))
+        monitor = user32.MonitorFromWindow(hwnd, 2)  # MONITOR_DEFAULTTONEAREST
+        info = MONITORINFO()
+        info.cbSize = ctypes.sizeof(MONITORINFO)
+        if not user32.GetMonitorInfoW(monitor, ctypes.byref(info)):
+            return False
+        screen = info.rcMonitor
+        return (rect.left <= screen.left and rect.top <= screen.top
+                and rect.right >= screen.right and rect.bottom >= screen.bottom)
+    except Exception:
+        return False
@@ -0,0 +1,86 @@
+# 对话录制模块
+# 把真实的补全请求和回复追加写入JSONL文件，供mock_server.py离线回放
+
+import json
+import threading
+
+from cache import make_cache_key
+
+def last_turn(messages):
+    """从最后一条用户消息开始的消息（回放时按这一段匹配录制记录）"""
+    for index in range(len(messages) - 1, -1, -1):
+        if messages[index].get("role") == "user":
+            return messages[index:]
+    return messages
+
+def recording_key(messages, tools=None):
+    """录制记录的匹配键：当前轮次的消息和工具描述，与模型无关"""
+    return make_cache_key("", last_turn(messages), tools)
+
+def last_user_text(messages):
+    """最后一条用户消息的文本"""
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            content = message.get("content") or ""
+            if isinstance(content, list):
+                return " ".join(part.get("text", "") for part in content if part.get("type") == "text")
+            return content
+    return ""
+
+def strip_images(messages):
+    """图片数据替换为占位符，避免录制文件中出现大段base64"""
+    stripped = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list):
+            message = dict(message, content=[
+                part if part.get("type") != "image_url"
+                else {"type": "image_url", "image_url": {"url": "[图片]"}}
+                for part in content
+            ])
+        stripped.append(message)
+    return stripped
+
+class Recorder:
+    """录制器，每次补全调用写一行 {"key", "request", "response", "latency"}"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def record(self, api_params, content, tool_calls, ttfb_ms=None, total_ms=None):
+        messages = api_params.get("messages", [])
+        entry = {
+            "key": recording_key(messages, api_params.get("tools")),
+            "request": {
+                "model": api_params.get("model"),
+                "messages": strip_images(messages),
+                "tools": api_params.get("tools"),
+                "tool_choice": api_params.get("tool_choice")
+            },
+            "response": {"content": content, "tool_calls": tool_calls},
+            "latency": {"ttfb_ms": ttfb_ms, "total_ms": total_ms}
+        }
+        line = json.dumps(entry, ensure_ascii=False)
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+def load_recordings(path):
+    """读取录制文件，跳过无法解析的行
+
+    手写的记录可以不带key，改用"match"字段按最后一条用户消息的子串匹配
+    """
+    entries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(entry, dict) and isinstance(entry.get("response"), dict):
+                entries.append(entry)
+    return entries
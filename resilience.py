@@ -0,0 +1,153 @@
+# 请求容错模块
+# 令牌桶限流、带随机抖动的指数退避重试（遵守Retry-After）和熔断器，
+# 接口不健康时快速失败，不再每条消息都等满一次超时
+
+import email.utils
+import random
+import threading
+import time
+
+class RateLimitExceeded(Exception):
+    """本地限流：等待令牌超过上限"""
+
+class CircuitOpenError(Exception):
+    """所有后端都处于熔断状态"""
+
+    def __init__(self, retry_in):
+        self.retry_in = retry_in
+        super().__init__(f"AI服务暂时不可用，约{max(1, round(retry_in))}秒后重试")
+
+def get_status_code(error):
+    """取出openai异常中的HTTP状态码，没有时返回None"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+def is_transient(error):
+    """是否是值得重试、并计入熔断的错误：超时、连接失败、429和5xx"""
+    status = get_status_code(error)
+    if status is not None:
+        return status in (408, 409, 429) or status >= 500
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    # openai.APIConnectionError / APITimeoutError，按类名判断以免在这里导入openai
+    return any(cls.__name__ in ("APIConnectionError", "APITimeoutError") for cls in type(error).__mro__)
+
+def get_retry_after(error):
+    """解析响应中的Retry-After（秒数或HTTP日期）和retry-after-ms，没有时返回None"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            retry_at = email.utils.parsedate_to_datetime(value)
+            return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class TokenBucket:
+    """令牌桶：平均每分钟rate_per_minute次，允许burst次突发"""
+
+    def __init__(self, rate_per_minute=20, burst=5):
+        self.rate = rate_per_minute / 60
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, max_wait=10):
+        """取一个令牌，需要等待时阻塞；等待时间超过max_wait秒时抛出RateLimitExceeded"""
+        if self.rate <= 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = (1 - self.tokens) / self.rate if self.tokens < 1 else 0.0
+            if wait > max_wait:
+                raise RateLimitExceeded(f"请求过于频繁，请约{round(wait)}秒后再试")
+            # 先扣除令牌（可能变为负数），等待期间到达的请求会排在后面
+            self.tokens -= 1
+        if wait > 0:
+            time.sleep(wait)
+
+class RetryPolicy:
+    """有上限的指数退避重试，延迟带完全随机抖动"""
+
+    def __init__(self, max_retries=2, base_delay=0.5, max_delay=8):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt, error=None):
+        """第attempt次重试（从1开始）前的等待秒数；Retry-After超出上限时返回None表示放弃"""
+        retry_after = get_retry_after(error) if error is not None else None
+        if retry_after is not None:
+            return retry_after if retry_after <= self.max_delay else None
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+class CircuitBreaker:
+    """熔断器
+
+    连续failure_threshold次暂时性失败后打开，reset_timeout秒内直接拒绝请求；
+    之后放行一个探测请求（半开），成功则恢复，失败则重新打开
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=3, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """是否允许发出请求"""
+        if self.failure_threshold <= 0:
+            return True
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                # 放行一个探测请求
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def retry_in(self):
+        """距离允许下一次探测还有多少秒"""
+        with self.lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def release(self):
+        """探测请求被取消、没有结果时调用：回到打开状态，下一个请求可以立即再次探测"""
+        with self.lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+
+    def record_success(self):
+        with self.lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
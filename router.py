@@ -0,0 +1,298 @@
+# 多后端路由模块
+# 按权重和首字延迟EWMA选择后端，出错时切换到下一个后端，
+# 可选对冲请求：首个后端在阈值内没有出字时向下一个后端再发一次，先出字的胜出
+
+import queue
+import threading
+import time
+
+from resilience import CircuitBreaker, CircuitOpenError, is_transient
+
+class HedgeLost(Exception):
+    """对冲请求中落败的一方，在收到首个片段时放弃"""
+
+class Claim:
+    """一次请求的抢先判定
+
+    请求在收到首个片段时调用claim()，返回False表示已有其他后端胜出；
+    对冲执行时胜出的一方会立即取消其余请求。hedged为True的是超过阈值后启动的对冲请求，
+    它使用独立的连接并用on_cancel注册中止连接的回调；首个请求走共享连接池，落败时在出字后放弃
+    """
+
+    def __init__(self, router, backend, state, hedged=False):
+        self.router = router
+        self.backend = backend
+        self.state = state
+        self.hedged = hedged
+        self.started = time.perf_counter()
+        self.cancelled = False
+        self.recorded = False
+        self.callbacks = []
+        self.lock = threading.Lock()
+        state["claims"].append(self)
+
+    def __call__(self):
+        # 落败的后端同样记录首字延迟，否则慢后端一直没有统计，每次都会被优先选中
+        self.record_latency()
+        with self.router.lock:
+            first = self.state["winner"] is None
+            if first:
+                self.state["winner"] = self.backend
+            won = self.state["winner"] is self.backend
+        if won and first:
+            for claim in list(self.state["claims"]):
+                if claim is not self:
+                    claim.cancel()
+        return won
+
+    def record_latency(self):
+        """记录本次请求的首字延迟，每个请求只记录一次"""
+        with self.lock:
+            if self.recorded:
+                return
+            self.recorded = True
+        self.router.record_latency(self.backend, (time.perf_counter() - self.started) * 1000)
+
+    def on_cancel(self, callback):
+        """注册取消回调，已经被取消时立即执行"""
+        with self.lock:
+            if not self.cancelled:
+                self.callbacks.append(callback)
+                return
+        self.record_latency()
+        callback()
+
+    def cancel(self):
+        """取消仍在等待首个片段的请求
+
+        中止了连接的请求不会再出字，按已等待的时间记录延迟（实际延迟至少这么长）；
+        没有注册回调的请求仍会在出字时记录真实的首字延迟
+        """
+        with self.lock:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            callbacks = self.callbacks
+            self.callbacks = []
+        if callbacks:
+            self.record_latency()
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+class Backend:
+    """一个接口后端"""
+
+    def __init__(self, name, api_base, api_key, model=None, weight=1.0):
+        self.name = name
+        self.api_base = api_base
+        self.api_key = api_key
+        self.model = model
+        self.weight = max(weight, 0.01)
+        self.client = None
+        self.client_lock = threading.Lock()
+        self.breaker = CircuitBreaker()
+        # 首字延迟的指数加权平均（毫秒），尚未请求过时为None
+        self.ewma_ms = None
+        self.requests = 0
+        self.failures = 0
+
+    def get_client(self, factory):
+        """按需创建该后端的OpenAI客户端"""
+        if self.client is None:
+            with self.client_lock:
+                if self.client is None:
+                    self.client = factory(self)
+        return self.client
+
+    def score(self):
+        """越小越优先：延迟按权重折算，没有请求过的后端优先试探"""
+        return (self.ewma_ms or 0.0) / self.weight
+
+class Router:
+    """后端路由
+
+    attempt(backend, claim)执行一次请求，claim为Claim：收到首个片段时调用claim()，
+    返回False表示已有其他后端胜出，请求应立即放弃（抛出HedgeLost）
+    """
+
+    def __init__(self, backends, hedge_after_ms=0, ewma_alpha=0.3, failure_penalty_ms=5000,
+                 failure_threshold=3, reset_timeout=30):
+        self.backends = backends
+        for backend in backends:
+            backend.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.hedge_after_ms = hedge_after_ms
+        self.ewma_alpha = ewma_alpha
+        self.failure_penalty_ms = failure_penalty_ms
+        self.lock = threading.Lock()
+        # 统计
+        self.failovers = 0
+        self.hedges = 0
+
+    def adopt_stats(self, old_router):
+        """热重载后沿用同一地址和模型的后端的延迟统计和客户端"""
+        if not old_router:
+            return
+        old = {(b.api_base, b.api_key, b.model): b for b in old_router.backends}
+        for backend in self.backends:
+            previous = old.get((backend.api_base, backend.api_key, backend.model))
+            if previous:
+                backend.ewma_ms = previous.ewma_ms
+                backend.requests = previous.requests
+                backend.failures = previous.failures
+                backend.client = previous.client
+                backend.breaker.state = previous.breaker.state
+                backend.breaker.failures = previous.breaker.failures
+                backend.breaker.opened_at = previous.breaker.opened_at
+
+    def ordered(self):
+        """按优先级排序的后端列表"""
+        with self.lock:
+            return sorted(self.backends, key=lambda backend: backend.score())
+
+    def record_latency(self, backend, latency_ms):
+        with self.lock:
+            backend.requests += 1
+            if backend.ewma_ms is None:
+                backend.ewma_ms = latency_ms
+            else:
+                backend.ewma_ms += self.ewma_alpha * (latency_ms - backend.ewma_ms)
+
+    def record_failure(self, backend, error):
+        """失败计为一次很慢的请求，之后的请求会优先选择其他后端
+
+        只有暂时性错误（超时、连接失败、429、5xx）计入熔断；其他错误说明后端仍可访问
+        """
+        with self.lock:
+            backend.requests += 1
+            backend.failures += 1
+            backend.ewma_ms = (backend.ewma_ms or 0.0) + self.failure_penalty_ms
+        if is_transient(error):
+            backend.breaker.record_failure()
+        else:
+            backend.breaker.record_success()
+
+    def circuit_open_error(self):
+        """所有后端都被熔断时的错误，附带最近一个后端恢复探测的剩余时间"""
+        return CircuitOpenError(min(backend.breaker.retry_in() for backend in self.backends))
+
+    def run(self, attempt):
+        """按优先级执行请求，失败时切换后端，返回胜出请求的结果
+
+        熔断中的后端被跳过，全部熔断时直接抛出CircuitOpenError
+        """
+        order = self.ordered()
+        if self.hedge_after_ms > 0 and len(order) > 1:
+            return self.run_hedged(attempt, order)
+
+        last_error = None
+        for backend in order:
+            # 熔断器只在真正要使用后端时询问，避免多个后端同时进入半开状态
+            if not backend.breaker.allow():
+                continue
+            if last_error is not None:
+                self.failovers += 1
+            state = {"winner": None, "claims": []}
+            try:
+                result = attempt(backend, Claim(self, backend, state))
+            except Exception as e:
+                self.record_failure(backend, e)
+                last_error = e
+                continue
+            backend.breaker.record_success()
+            return result
+        raise last_error or self.circuit_open_error()
+
+    def run_hedged(self, attempt, order):
+        """对冲执行：当前请求在hedge_after_ms内没有出字就启动下一个后端
+
+        某个请求胜出时立即取消其余请求（中止连接）；全部失败时抛出最后一个错误
+        """
+        state = {"winner": None, "claims": []}
+        results = queue.Queue()
+        next_index = 0
+        running = 0
+        last_error = None
+
+        def launch(hedged=False):
+            """启动下一个未熔断的后端，没有可用后端时返回False
+
+            hedged为True表示与仍在进行的请求并行的对冲请求
+            """
+            nonlocal next_index, running
+            while next_index < len(order) and not order[next_index].breaker.allow():
+                next_index += 1
+            if next_index >= len(order):
+                return False
+            backend = order[next_index]
+            next_index += 1
+            running += 1
+            claim = Claim(self, backend, state, hedged=hedged)
+
+            def run_attempt():
+                try:
+                    results.put((backend, claim, attempt(backend, claim), None))
+                except Exception as e:
+                    results.put((backend, claim, None, e))
+
+            threading.Thread(target=run_attempt, name=f"hedge-{backend.name}", daemon=True).start()
+            return True
+
+        if not launch():
+            raise self.circuit_open_error()
+        deadline = time.monotonic() + self.hedge_after_ms / 1000
+        while True:
+            can_hedge = next_index < len(order) and state["winner"] is None
+            timeout = max(0, deadline - time.monotonic()) if can_hedge else None
+            try:
+                backend, claim, result, error = results.get(timeout=timeout)
+            except queue.Empty:
+                if launch(hedged=True):
+                    self.hedges += 1
+                deadline = time.monotonic() + self.hedge_after_ms / 1000
+                continue
+
+            running -= 1
+            if error is None and state["winner"] is backend:
+                backend.breaker.record_success()
+                return result
+            if isinstance(error, HedgeLost):
+                if claim.cancelled:
+                    # 还没出字就被取消，无法判断后端是否健康；半开状态的探测机会留给下一个请求
+                    backend.breaker.release()
+                else:
+                    # 落败的后端同样返回了内容，说明是健康的
+                    backend.breaker.record_success()
+                continue
+            if error is not None:
+                self.record_failure(backend, error)
+                last_error = error
+                if state["winner"] is backend:
+                    # 胜出后在传输中途失败，内容已经部分展示，不再切换
+                    raise error
+            if running == 0 and state["winner"] is None:
+                # 所有进行中的请求都失败了，立即切换到下一个后端
+                if not launch():
+                    raise last_error or self.circuit_open_error()
+                self.failovers += 1
+                deadline = time.monotonic() + self.hedge_after_ms / 1000
+
+    def stats(self):
+        """各后端的统计信息"""
+        with self.lock:
+            return {
+                "failovers": self.failovers,
+                "hedges": self.hedges,
+                "backends": [{
+                    "name": backend.name,
+                    "api_base": backend.api_base,
+                    "model": backend.model,
+                    "weight": backend.weight,
+                    "ewma_ms": round(backend.ewma_ms, 1) if backend.ewma_ms is not None else None,
+                    "requests": backend.requests,
+                    "failures": backend.failures,
+                    "circuit": backend.breaker.state
+                } for backend in self.backends]
+            }
@@ -0,0 +1,110 @@
+# 宠物精灵绘制模块
+# 代替QLabel.setPixmap：只重绘相邻两帧之间变化的矩形区域，
+# 可选按每帧的透明通道设置窗口遮罩，让合成器只处理宠物实际占用的区域
+
+from PyQt6.QtWidgets import QWidget
+from PyQt6.QtCore import QPoint, QRect
+from PyQt6.QtGui import QBitmap, QImage, QPainter, QRegion
+
+def first_difference(a, b):
+    """两段等长字节中第一个不同的位置（二分查找，只做O(log n)次切片比较），相同时返回None"""
+    if a == b:
+        return None
+    low, high = 0, len(a)
+    while high - low > 1:
+        middle = (low + high) // 2
+        if a[low:middle] == b[low:middle]:
+            low = middle
+        else:
+            high = middle
+    return low
+
+def frame_damage(previous, current):
+    """两帧之间变化的像素所在的最小矩形（QImage，尺寸相同），没有变化时返回空QRect"""
+    if previous.size() != current.size():
+        return QRect(0, 0, current.width(), current.height())
+    previous = previous.convertToFormat(QImage.Format.Format_ARGB32_Premultiplied)
+    current = current.convertToFormat(QImage.Format.Format_ARGB32_Premultiplied)
+    stride = current.bytesPerLine()
+    width = current.width()
+    old_bytes = previous.constBits().asstring(previous.sizeInBytes())
+    new_bytes = current.constBits().asstring(current.sizeInBytes())
+
+    top = bottom = None
+    left, right = width, -1
+    for y in range(current.height()):
+        start = y * stride
+        old_row = old_bytes[start:start + width * 4]
+        new_row = new_bytes[start:start + width * 4]
+        first = first_difference(old_row, new_row)
+        if first is None:
+            continue
+        if top is None:
+            top = y
+        bottom = y
+        left = min(left, first // 4)
+        # 从右往左找最后一个不同的像素
+        last = len(new_row) - 1 - first_difference(old_row[::-1], new_row[::-1])
+        right = max(right, last // 4)
+
+    if top is None:
+        return QRect()
+    return QRect(left, top, right - left + 1, bottom - top + 1)
+
+def alpha_mask(image):
+    """由帧的透明通道生成遮罩区域（完全透明的像素不属于窗口）"""
+    return QRegion(QBitmap.fromImage(image.createAlphaMask()))
+
+class SpriteView(QWidget):
+    """精灵绘制控件
+
+    帧居中显示；set_frame给出变化区域时只重绘这一块，否则重绘整个帧
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pixmap = None
+        self.mask_region = None
+
+    def frame_offset(self):
+        """帧在控件中的左上角位置"""
+        if self.pixmap is None:
+            return QPoint(0, 0)
+        return QPoint((self.width() - self.pixmap.width()) // 2,
+                      (self.height() - self.pixmap.height()) // 2)
+
+    def set_frame(self, pixmap, damage=None, mask=None):
+        """切换到新的一帧
+
+        damage: 相对帧左上角的变化区域（QRect），None表示整帧重绘，空矩形表示无需重绘
+        mask: 该帧的遮罩区域（QRegion），给出时同时设置窗口遮罩
+        """
+        size_changed = self.pixmap is None or self.pixmap.size() != pixmap.size()
+        self.pixmap = pixmap
+        offset = self.frame_offset()
+        if damage is None or size_changed:
+            self.update()
+        elif not damage.isEmpty():
+            self.update(damage.translated(offset))
+
+        if mask is not None and mask is not self.mask_region:
+            self.mask_region = mask
+            window = self.window()
+            window.setMask(mask.translated(self.mapTo(window, offset)))
+
+    def clear_mask(self):
+        """取消窗口遮罩"""
+        if self.mask_region is not None:
+            self.mask_region = None
+            self.window().clearMask()
+
+    def paintEvent(self, event):
+        if self.pixmap is None:
+            return
+        painter = QPainter(self)
+        offset = self.frame_offset()
+        # 只绘制需要更新的部分，透明窗口在绘制前已经把这块区域清空
+        source = event.rect().translated(-offset).intersected(self.pixmap.rect())
+        if not source.isEmpty():
+            painter.drawPixmap(source.translated(offset), self.pixmap, source)
+        painter.end()
@@ -0,0 +1,39 @@
+# 启动耗时追踪模块
+# 记录启动各阶段耗时，检查宠物窗口出现的时间是否超出预算
+
+import json
+import time
+
+class StartupTrace:
+    """启动阶段计时"""
+
+    def __init__(self, started_at=None):
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.last = self.started_at
+        self.phases = []  # [(阶段名, 耗时毫秒)]
+        self.marks = {}   # 阶段名 -> 距启动的毫秒数
+
+    def mark(self, phase):
+        """结束一个阶段并记录耗时"""
+        now = time.perf_counter()
+        self.phases.append((phase, (now - self.last) * 1000))
+        self.marks[phase] = (now - self.started_at) * 1000
+        self.last = now
+
+    def elapsed_ms(self, phase=None):
+        """到指定阶段（默认当前）为止的总耗时"""
+        if phase is not None:
+            return self.marks.get(phase)
+        return (time.perf_counter() - self.started_at) * 1000
+
+    def report(self):
+        """生成各阶段耗时报告"""
+        lines = ["启动耗时:"]
+        for phase, duration in self.phases:
+            lines.append(f"  {phase}: {duration:.1f}ms（累计 {self.marks[phase]:.1f}ms）")
+        return "\n".join(lines)
+
+    def to_json(self):
+        """各阶段距启动的累计毫秒数（JSON单行），供基准测试解析"""
+        return json.dumps({"startup_ms": {phase: round(ms, 1) for phase, ms in self.marks.items()}},
+                          ensure_ascii=False)
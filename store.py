@@ -0,0 +1,167 @@
+# 对话记录存储模块
+# 基于SQLite（WAL模式）的追加式对话记录，后台线程批量写入，FTS5全文检索
+
+import json
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+# 写入线程的结束标记
+_STOP = object()
+
+def message_text(message):
+    """提取消息中可检索的文本，图片只记录占位符"""
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        parts = []
+        for part in content:
+            if part.get("type") == "text":
+                parts.append(part.get("text", ""))
+            else:
+                parts.append("[图片]")
+        return " ".join(parts)
+    return str(content)
+
+class ConversationStore:
+    """对话记录存储
+
+    append()只把记录放进队列，由后台线程按批写入，调用方（包括GUI线程）不会被磁盘IO阻塞
+    """
+
+    def __init__(self, db_path, batch_interval=0.5, batch_size=100):
+        self.db_path = db_path
+        self.batch_interval = batch_interval
+        self.batch_size = batch_size
+        self.session_id = uuid.uuid4().hex
+        self.queue = queue.Queue()
+        self.fts_enabled = False
+
+        self.setup_database()
+
+        # 读连接：WAL模式下读不会被写入线程阻塞
+        self.read_db = sqlite3.connect(db_path, check_same_thread=False)
+        self.read_lock = threading.Lock()
+
+        self.writer = threading.Thread(target=self.write_loop, name="conversation-store", daemon=True)
+        self.writer.start()
+
+    def setup_database(self):
+        """建表并开启WAL"""
+        db = sqlite3.connect(self.db_path)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "session TEXT NOT NULL, "
+                "role TEXT NOT NULL, "
+                "content TEXT NOT NULL, "
+                "extra TEXT, "
+                "created_at REAL NOT NULL)"
+            )
+            # trigram分词支持中文子串检索（需要SQLite 3.34+），不可用时退回LIKE
+            try:
+                db.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+                    "content, content='messages', content_rowid='id', tokenize='trigram')"
+                )
+                db.execute(
+                    "CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN "
+                    "INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content); END"
+                )
+                self.fts_enabled = True
+            except sqlite3.OperationalError:
+                self.fts_enabled = False
+            db.commit()
+        finally:
+            db.close()
+
+    def append(self, message):
+        """记录一条消息（user/assistant/tool），立即返回"""
+        extra = {key: message[key] for key in ("tool_calls", "tool_call_id") if key in message}
+        self.queue.put((
+            self.session_id,
+            message.get("role", ""),
+            message_text(message),
+            json.dumps(extra, ensure_ascii=False) if extra else None,
+            time.time()
+        ))
+
+    def write_loop(self):
+        """后台写入线程：攒够一批或等待batch_interval后一次性提交"""
+        db = sqlite3.connect(self.db_path)
+        db.execute("PRAGMA synchronous=NORMAL")
+        running = True
+        while running:
+            batch = []
+            try:
+                item = self.queue.get()
+                deadline = time.monotonic() + self.batch_interval
+                while True:
+                    if item is _STOP:
+                        running = False
+                        break
+                    batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        break
+                    item = self.queue.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                pass
+
+            if batch:
+                try:
+                    with db:
+                        db.executemany(
+                            "INSERT INTO messages (session, role, content, extra, created_at) "
+                            "VALUES (?, ?, ?, ?, ?)",
+                            batch
+                        )
+                except sqlite3.Error as e:
+                    print(f"对话记录写入失败: {str(e)}")
+        db.close()
+
+    def recent(self, limit=50, before_id=None):
+        """按时间顺序返回最近的limit条记录 [(id, role, content, created_at)]"""
+        with self.read_lock:
+            if before_id is None:
+                rows = self.read_db.execute(
+                    "SELECT id, role, content, created_at FROM messages ORDER BY id DESC LIMIT ?",
+                    (limit,)
+                ).fetchall()
+            else:
+                rows = self.read_db.execute(
+                    "SELECT id, role, content, created_at FROM messages WHERE id < ? ORDER BY id DESC LIMIT ?",
+                    (before_id, limit)
+                ).fetchall()
+        return rows[::-1]
+
+    def search(self, query, limit=20):
+        """全文检索，按时间倒序返回 [(id, role, content, created_at)]"""
+        query = query.strip()
+        if not query:
+            return []
+        with self.read_lock:
+            # trigram至少需要3个字符，更短的查询用LIKE
+            if self.fts_enabled and len(query) >= 3:
+                return self.read_db.execute(
+                    "SELECT m.id, m.role, m.content, m.created_at FROM messages_fts f "
+                    "JOIN messages m ON m.id = f.rowid WHERE messages_fts MATCH ? "
+                    "ORDER BY m.id DESC LIMIT ?",
+                    ('"' + query.replace('"', '""') + '"', limit)
+                ).fetchall()
+            pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            return self.read_db.execute(
+                "SELECT id, role, content, created_at FROM messages "
+                "WHERE content LIKE ? ESCAPE '\\' ORDER BY id DESC LIMIT ?",
+                (pattern, limit)
+            ).fetchall()
+
+    def close(self):
+        """写完队列中剩余的记录后关闭"""
+        if self.writer.is_alive():
+            self.queue.put(_STOP)
+            self.writer.join(timeout=5)
+        with self.read_lock:
+            self.read_db.close()
@@ -0,0 +1,220 @@
+# 工具进程池
+# 指定的工具在预先启动的工作进程中执行：卡死的网络请求、截图或COM调用到达期限后直接结束进程，
+# 不会拖住主程序；工作进程常驻并提前导入工具模块，重量级依赖只加载一次。
+# 超时、异常退出或内存超过上限的工作进程会被替换；截图数据通过共享内存传回，不经过管道复制
+#
+# 工作进程用spawn方式启动（Qt程序中fork不安全），以tool_worker为主模块，不会导入main.py和界面模块；
+# 打包后的程序需要在入口处尽早调用multiprocessing.freeze_support()
+
+import multiprocessing
+import queue
+import sys
+import threading
+from multiprocessing import shared_memory
+
+import tool_worker
+from config import get_config
+
+def print_debug(message):
+    """打印调试信息"""
+    if get_config().debug:
+        print(f"[TOOL POOL DEBUG] {message}")
+
+# 启动工作进程时临时替换主模块，多个线程同时启动时需要互斥
+_spawn_lock = threading.Lock()
+
+def start_process(process):
+    """以tool_worker为主模块启动工作进程
+
+    spawn方式会在子进程中重新导入父进程的主模块（main.py，连带PyQt6和各窗口模块），
+    这些模块也会计入工作进程的内存；启动期间把主模块换成只导入工具注册表的tool_worker
+    """
+    with _spawn_lock:
+        main_module = sys.modules['__main__']
+        sys.modules['__main__'] = tool_worker
+        try:
+            process.start()
+        finally:
+            sys.modules['__main__'] = main_module
+
+def read_shared_result(result):
+    """从共享内存取回图片数据并释放共享内存"""
+    if not isinstance(result, dict) or "shared_memory" not in result:
+        return result
+    result = dict(result)
+    name, size = result.pop("shared_memory")
+    shared = shared_memory.SharedMemory(name=name)
+    try:
+        result["data_url"] = bytes(shared.buf[:size]).decode("ascii")
+    finally:
+        shared.close()
+        shared.unlink()
+    return result
+
+class ToolWorker:
+    """一个工作进程及其管道"""
+
+    def __init__(self, context, plugin_dirs, overrides, preload):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=tool_worker.worker_main,
+                                       args=(child_conn, plugin_dirs, overrides, preload),
+                                       name="tool-worker", daemon=True)
+        start_process(self.process)
+        child_conn.close()
+        self.ready = False
+        self.calls = 0
+
+    def wait_ready(self, timeout):
+        """等待工作进程完成启动和预加载，超时返回False"""
+        if not self.ready:
+            if not self.conn.poll(timeout):
+                return False
+            self.conn.recv()
+            self.ready = True
+        return True
+
+    def call(self, name, arguments, timeout):
+        """执行一次工具调用，返回(结果, 内存占用)
+
+        超过timeout秒抛出TimeoutError，进程已退出时抛出EOFError或OSError
+        """
+        self.conn.send((name, arguments))
+        if not self.conn.poll(timeout):
+            raise TimeoutError
+        self.calls += 1
+        return self.conn.recv()
+
+    def stop(self, timeout=1):
+        """通知工作进程退出，没有及时退出时强制结束"""
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.kill()
+        self.conn.close()
+
+    def kill(self):
+        """强制结束工作进程"""
+        self.process.kill()
+        self.process.join(1)
+        self.conn.close()
+
+class ToolProcessPool:
+    """工具进程池
+
+    tools中的工具在工作进程中执行；每次调用有期限，到期后结束该进程并启动新的进程替换
+    """
+
+    def __init__(self, tools, workers=2, max_memory_mb=300, plugin_dirs=('plugins',), overrides=None,
+                 startup_timeout=30):
+        self.tools = set(tools)
+        self.workers = max(1, workers)
+        self.max_memory = max_memory_mb * 1024 * 1024 if max_memory_mb else None
+        self.plugin_dirs = list(plugin_dirs)
+        # config.json中的functions，工作进程中的工具与主进程使用相同的覆盖和禁用设置
+        self.overrides = list(overrides or [])
+        self.startup_timeout = startup_timeout
+        self.context = multiprocessing.get_context("spawn")
+        self.idle = queue.Queue()
+        self.lock = threading.Lock()
+        self.started = False
+        self.closed = False
+        # 统计
+        self.calls = 0
+        self.timeouts = 0
+        self.crashes = 0
+        self.recycled = 0
+
+    def spawn(self):
+        return ToolWorker(self.context, self.plugin_dirs, self.overrides, sorted(self.tools))
+
+    def start(self):
+        """启动所有工作进程（不等待它们完成预加载）"""
+        with self.lock:
+            if self.started or self.closed:
+                return
+            self.started = True
+            for _ in range(self.workers):
+                self.idle.put(self.spawn())
+        print_debug(f"已启动{self.workers}个工具进程: {', '.join(sorted(self.tools))}")
+
+    def replace(self, worker, kill=True):
+        """结束一个工作进程并补充新的进程"""
+        if kill:
+            worker.kill()
+        else:
+            worker.stop()
+        if not self.closed:
+            self.idle.put(self.spawn())
+
+    def release(self, worker):
+        """调用结束后把工作进程放回池中，池已关闭时让它退出"""
+        if self.closed:
+            worker.stop()
+        else:
+            self.idle.put(worker)
+
+    def call(self, name, arguments, timeout):
+        """在工作进程中执行工具，超时、进程崩溃等都以错误字符串返回"""
+        self.start()
+        try:
+            worker = self.idle.get(timeout=timeout)
+        except queue.Empty:
+            return f"错误：函数 '{name}' 等待空闲的工具进程超时（{timeout}秒）"
+
+        # 新启动的进程先完成导入，启动耗时不计入本次调用的期限
+        if not worker.wait_ready(self.startup_timeout):
+            print_debug("工具进程启动超时，重新启动")
+            self.crashes += 1
+            self.replace(worker)
+            return f"错误：函数 '{name}' 的工具进程启动失败"
+
+        self.calls += 1
+        try:
+            result, rss = worker.call(name, arguments, timeout)
+        except TimeoutError:
+            self.timeouts += 1
+            print_debug(f"{name} 执行超时，结束工具进程 {worker.process.pid}")
+            self.replace(worker)
+            return f"错误：函数 '{name}' 执行超时（{timeout}秒），已终止"
+        except (EOFError, OSError) as e:
+            self.crashes += 1
+            print_debug(f"工具进程异常退出: {str(e)}")
+            self.replace(worker)
+            return f"错误：函数 '{name}' 执行时工具进程异常退出"
+
+        # 先取回共享内存中的数据，工作进程退出后共享内存可能随之释放
+        try:
+            result = read_shared_result(result)
+        except OSError as e:
+            result = f"错误：函数 '{name}' 的结果读取失败 - {str(e)}"
+        if self.max_memory and rss and rss > self.max_memory:
+            self.recycled += 1
+            print_debug(f"工具进程内存占用{rss / 1024 / 1024:.0f}MB，超过上限，替换")
+            self.replace(worker, kill=False)
+        else:
+            self.release(worker)
+        return result
+
+    def close(self):
+        """关闭进程池，正在执行的调用结束后其进程也会退出"""
+        with self.lock:
+            self.closed = True
+        while True:
+            try:
+                worker = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            worker.stop()
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "tools": sorted(self.tools),
+            "calls": self.calls,
+            "timeouts": self.timeouts,
+            "crashes": self.crashes,
+            "recycled": self.recycled
+        }
@@ -0,0 +1,264 @@
+# 工具插件注册表
+# 每个工具是plugins目录中的一个模块，模块中与文件同名的函数就是工具的实现；
+# 工具描述和参数schema由函数的类型注解和文档字符串生成（用ast解析源码，不导入模块），
+# 模块在第一次调用时才导入，启动时不加载任何工具的依赖，一个工具导入失败也不影响其他工具
+#
+# 插件写法见plugins/__init__.py
+
+import ast
+import importlib.util
+import os
+import re
+import sys
+import threading
+
+from bundle import get_resource_path
+from config import get_config
+
+# Python类型名对应的JSON Schema类型
+TYPE_NAMES = {
+    'str': 'string',
+    'int': 'integer',
+    'float': 'number',
+    'bool': 'boolean',
+    'list': 'array',
+    'List': 'array',
+    'dict': 'object',
+    'Dict': 'object'
+}
+
+# 插件模块中可以声明的元数据常量
+METADATA = {'SIDE_EFFECT': 'side_effect', 'TIMEOUT': 'timeout'}
+
+def print_debug(message):
+    """打印调试信息（插件模块也使用这个函数）"""
+    if get_config().debug:
+        print(f"[TOOL DEBUG] {message}")
+
+def is_none(node):
+    return isinstance(node, ast.Constant) and node.value is None
+
+def annotation_schema(node):
+    """把参数的类型注解（ast节点）转换为JSON Schema，返回(schema, 是否允许为None)
+
+    支持str/int/float/bool/list/dict、list[X]、Literal[...]、Optional[X]和X | None，
+    其他注解不限制类型
+    """
+    if node is None:
+        return {}, False
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        # 字符串形式的注解
+        return annotation_schema(ast.parse(node.value, mode='eval').body)
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.BitOr):
+        if is_none(node.right):
+            return annotation_schema(node.left)[0], True
+        if is_none(node.left):
+            return annotation_schema(node.right)[0], True
+        return {}, False
+    if isinstance(node, ast.Name) and node.id in TYPE_NAMES:
+        return {"type": TYPE_NAMES[node.id]}, False
+    if isinstance(node, ast.Subscript):
+        base = node.value.attr if isinstance(node.value, ast.Attribute) else getattr(node.value, 'id', '')
+        items = node.slice.elts if isinstance(node.slice, ast.Tuple) else [node.slice]
+        if base == 'Optional':
+            return annotation_schema(items[0])[0], True
+        if base == 'Literal':
+            values = [ast.literal_eval(item) for item in items]
+            value_type = TYPE_NAMES.get(type(values[0]).__name__) if values else None
+            schema = {"type": value_type} if value_type else {}
+            schema["enum"] = values
+            return schema, False
+        if TYPE_NAMES.get(base) == 'array':
+            return {"type": "array", "items": annotation_schema(items[0])[0]}, False
+        if TYPE_NAMES.get(base) == 'object':
+            return {"type": "object"}, False
+    return {}, False
+
+def parse_docstring(docstring):
+    """拆分文档字符串：“参数:”之前是工具描述，之后每行是“参数名: 说明”"""
+    description = []
+    params = {}
+    current = None
+    in_params = False
+    for line in (docstring or '').splitlines():
+        line = line.strip()
+        if line in ('参数:', '参数：', 'Args:'):
+            in_params = True
+            continue
+        if not in_params:
+            description.append(line)
+            continue
+        match = re.match(r'(\w+)\s*[:：]\s*(.*)', line)
+        if match:
+            current = match.group(1)
+            params[current] = match.group(2)
+        elif line and current:
+            # 说明换行续写
+            params[current] += line
+    return '\n'.join(description).strip(), params
+
+class Tool:
+    """一个工具插件：解析出的描述和schema，以及首次调用时导入的实现函数"""
+
+    def __init__(self, name, path, description, parameters, arguments, required,
+                 side_effect=False, timeout=None):
+        self.name = name
+        self.path = path
+        self.description = description
+        self.parameters = parameters
+        # 函数签名中的参数名和必填参数（不受config.json中覆盖的schema影响）
+        self.arguments = arguments
+        self.required = required
+        self.side_effect = side_effect
+        self.timeout = timeout
+        self.function = None
+        self.error = None
+        self.lock = threading.Lock()
+
+    def schema(self):
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.description,
+                "parameters": self.parameters
+            }
+        }
+
+def parse_plugin(path):
+    """用ast解析插件源码，生成Tool（不执行模块代码）
+
+    插件中没有与文件同名的函数时抛出ValueError
+    """
+    name = os.path.splitext(os.path.basename(path))[0]
+    with open(path, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=path)
+
+    metadata = {}
+    function = None
+    for node in tree.body:
+        if (isinstance(node, ast.Assign) and len(node.targets) == 1
+                and isinstance(node.targets[0], ast.Name) and node.targets[0].id in METADATA):
+            metadata[METADATA[node.targets[0].id]] = ast.literal_eval(node.value)
+        elif isinstance(node, ast.FunctionDef) and node.name == name:
+            function = node
+    if function is None:
+        raise ValueError(f"没有名为{name}的函数")
+
+    description, param_docs = parse_docstring(ast.get_docstring(function))
+    args = function.args
+    # defaults对应最后几个位置参数，kw_defaults中None表示该关键字参数没有默认值
+    positional_defaults = [False] * (len(args.args) - len(args.defaults)) + [True] * len(args.defaults)
+    signature = list(zip(args.args, positional_defaults))
+    signature += [(arg, default is not None) for arg, default in zip(args.kwonlyargs, args.kw_defaults)]
+
+    properties = {}
+    required = []
+    for arg, has_default in signature:
+        schema, nullable = annotation_schema(arg.annotation)
+        if arg.arg in param_docs:
+            schema["description"] = param_docs[arg.arg]
+        properties[arg.arg] = schema
+        if not has_default and not nullable:
+            required.append(arg.arg)
+
+    parameters = {"type": "object", "properties": properties, "required": required}
+    return Tool(name, path, description or name, parameters, list(properties), required, **metadata)
+
+class ToolRegistry:
+    """工具注册表
+
+    plugin_dirs中的目录按顺序扫描，同名工具以先找到的为准；
+    overrides为config.json中的functions，按name覆盖description、parameters、side_effect、timeout，
+    enabled为false时禁用该工具
+    """
+
+    def __init__(self, plugin_dirs=('plugins',), overrides=None):
+        self.tools = {}
+        for directory in plugin_dirs:
+            self.discover(directory)
+        for override in overrides or []:
+            self.apply_override(override)
+
+    def discover(self, directory):
+        """扫描一个插件目录，无效的插件打印警告后跳过"""
+        path = get_resource_path(directory)
+        if path is None or not os.path.isdir(path):
+            print_debug(f"插件目录不存在: {directory}")
+            return
+        for entry in sorted(os.scandir(path), key=lambda entry: entry.name):
+            if not entry.name.endswith('.py') or entry.name.startswith('_'):
+                continue
+            name = entry.name[:-3]
+            if name in self.tools:
+                print_debug(f"工具 {name} 已存在，忽略 {entry.path}")
+                continue
+            try:
+                self.tools[name] = parse_plugin(entry.path)
+            except (OSError, SyntaxError, ValueError) as e:
+                print(f"工具插件 {entry.name} 无效，已跳过: {str(e)}")
+        print_debug(f"已发现{len(self.tools)}个工具: {', '.join(self.tools)}")
+
+    def apply_override(self, override):
+        name = override.get('name')
+        tool = self.tools.get(name)
+        if tool is None:
+            print_debug(f"functions中的 {name} 没有对应的插件，已忽略")
+            return
+        if override.get('enabled', True) is False:
+            del self.tools[name]
+            return
+        for key in ('description', 'parameters', 'side_effect', 'timeout'):
+            if key in override:
+                setattr(tool, key, override[key])
+
+    def schemas(self):
+        """发送给接口的工具描述列表"""
+        return [tool.schema() for tool in self.tools.values()]
+
+    def side_effect_tools(self):
+        return {name for name, tool in self.tools.items() if tool.side_effect}
+
+    def timeouts(self):
+        """声明了超时的工具 -> 超时秒数"""
+        return {name: tool.timeout for name, tool in self.tools.items() if tool.timeout is not None}
+
+    def load(self, tool):
+        """导入工具模块并取出实现函数，失败时记录错误（之后的调用直接返回该错误）"""
+        with tool.lock:
+            if tool.function is not None or tool.error is not None:
+                return
+            module_name = f"plugins.{tool.name}"
+            try:
+                module = sys.modules.get(module_name)
+                if module is None or getattr(module, '__file__', None) != tool.path:
+                    spec = importlib.util.spec_from_file_location(module_name, tool.path)
+                    module = importlib.util.module_from_spec(spec)
+                    sys.modules[module_name] = module
+                    spec.loader.exec_module(module)
+                tool.function = getattr(module, tool.name)
+                print_debug(f"工具模块已加载: {tool.name}")
+            except Exception as e:
+                sys.modules.pop(module_name, None)
+                tool.error = f"{type(e).__name__}: {str(e)}"
+                print(f"工具 {tool.name} 加载失败: {tool.error}")
+
+    def execute(self, function_name, arguments):
+        """执行工具，未知工具、加载失败和执行异常都以错误字符串返回"""
+        tool = self.tools.get(function_name)
+        if tool is None:
+            return f"错误：未知的函数 '{function_name}'"
+        self.load(tool)
+        if tool.error is not None:
+            return f"错误：工具 '{function_name}' 加载失败 - {tool.error}"
+
+        missing = [name for name in tool.required if name not in arguments]
+        if missing:
+            return f"错误：缺少参数 {', '.join(missing)}"
+        # 忽略函数签名中没有的参数
+        kwargs = {name: value for name, value in arguments.items() if name in tool.arguments}
+        try:
+            return tool.function(**kwargs)
+        except Exception as e:
+            print_debug(f"函数执行失败: {str(e)}")
+            return f"错误：函数执行失败 - {str(e)}"
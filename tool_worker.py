@@ -0,0 +1,57 @@
+# 工具进程池的工作进程入口
+# 工作进程以这个模块为主模块启动，只导入工具注册表和需要的工具插件，不加载PyQt6和界面模块
+
+from multiprocessing import shared_memory
+
+from power import get_psutil
+from tool_registry import ToolRegistry
+
+def get_rss():
+    """当前进程占用的内存（字节），无法获取时返回None"""
+    psutil = get_psutil()
+    if psutil is not None:
+        try:
+            return psutil.Process().memory_info().rss
+        except Exception:
+            return None
+    try:
+        import resource
+        # 没有psutil时退而使用峰值内存（Linux上单位为KB）
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except (ImportError, OSError):
+        return None
+
+def worker_main(conn, plugin_dirs, overrides, preload):
+    """工作进程主循环：接收(工具名, 参数)，返回(结果, 内存占用)，收到None时退出
+
+    图片结果的data_url放入共享内存，只把名称和长度传回；共享内存在处理下一个请求时关闭，
+    此时主进程已经读完（Windows上所有句柄关闭后共享内存才会释放）
+    """
+    registry = ToolRegistry(plugin_dirs, overrides)
+    for name in preload:
+        tool = registry.tools.get(name)
+        if tool is not None:
+            registry.load(tool)
+    conn.send("ready")
+
+    shared = None
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if shared is not None:
+            shared.close()
+            shared = None
+        if request is None:
+            break
+
+        name, arguments = request
+        result = registry.execute(name, arguments)
+        if isinstance(result, dict) and isinstance(result.get("data_url"), str):
+            data = result["data_url"].encode("ascii")
+            shared = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+            shared.buf[:len(data)] = data
+            result = dict(result, data_url=None, shared_memory=(shared.name, len(data)))
+        conn.send((result, get_rss()))
+    conn.close()
@@ -0,0 +1,47 @@
+# 后台任务模块
+# 将耗时操作（AI请求、工具调用等）放到线程池中执行，结果通过信号回到GUI线程
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+class WorkerSignals(QObject):
+    """后台任务信号
+
+    信号对象在GUI线程中创建，工作线程发出的信号会自动以队列方式投递到GUI线程
+    """
+    delta = pyqtSignal(str, bool)     # 流式片段（内容，是否替换）
+    status = pyqtSignal(str)          # 简短的状态提示（重试等）
+    finished = pyqtSignal(object)     # 任务结果
+    error = pyqtSignal(str)           # 错误信息
+
+class Worker(QRunnable):
+    """在线程池中执行一个函数"""
+
+    def __init__(self, fn, *args, streaming=False, **kwargs):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = WorkerSignals()
+
+        # 流式任务会额外收到on_delta和on_status回调，用于把片段和状态发回GUI线程
+        if streaming:
+            self.kwargs["on_delta"] = self.emit_delta
+            self.kwargs["on_status"] = self.signals.status.emit
+
+    def emit_delta(self, text, replace=False):
+        """从工作线程发送流式片段"""
+        self.signals.delta.emit(text, replace)
+
+    def run(self):
+        """执行任务（运行在工作线程中）"""
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except Exception as e:
+            self.signals.error.emit(str(e))
+            return
+        self.signals.finished.emit(result)
+
+def start_worker(worker):
+    """把任务提交到全局线程池"""
+    QThreadPool.globalInstance().start(worker)
+    return worker